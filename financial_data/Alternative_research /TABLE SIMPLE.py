@@ -1,6 +1,12 @@
-import os, json, time, csv, requests
-from typing import Dict, Any, Iterable, Optional, Tuple
+import itertools
+import os, json, time, threading, requests
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from cosine_similarity_selection import choose_revenue_substitute  # your function
 
@@ -10,11 +16,36 @@ SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
 OUT_DIR = "financial_csv_final_y"
 os.makedirs(OUT_DIR, exist_ok=True)
 
+MAX_WORKERS = 8        # parallel ticker workers (the workload is pure I/O wait)
+REQUESTS_PER_SEC = 9   # stay under SEC's 10 req/s limit across ALL threads
+
+# One pooled keep-alive session shared by every worker thread — avoids a fresh
+# TCP+TLS handshake per call and retries transient SEC errors transparently.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.25,
+                      status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# Simple token bucket: every request reserves the next 1/REQUESTS_PER_SEC slot.
+_rate_lock = threading.Lock()
+_next_slot = 0.0
+
+def _throttle() -> None:
+    global _next_slot
+    with _rate_lock:
+        now = time.monotonic()
+        wait = _next_slot - now
+        _next_slot = max(now, _next_slot) + 1.0 / REQUESTS_PER_SEC
+    if wait > 0:
+        time.sleep(wait)
+
 #TICKERS = ["NVDA"]
 TICKERS = [ "NVDA","MSFT","AAPL","AMZN","META","AVGO","GOOGL","GOOG","TSLA","NFLX", "PLTR","COST","ASML","CSCO","TMUS","AMD","AZN","LIN","APP","SHOP", "PEP","INTU","PDD","MU","QCOM","BKNG","TXN","LRCX","ISRG","ADBE", "AMGN","AMAT","ARM","GILD","PANW","INTC","KLAC","HON","CRWD","MELI", "ADI","ADP","CMCSA","DASH","CEG","CDNS","VRTX","MSTR","SBUX","SNPS", "ORLY","MDLZ","CTAS","ABNB","TRI","MAR","ADSK","PYPL","FTNT","MRVL", "REGN","MNST","WDAY","CSX","AXON","AEP","NXPI","FAST","ROP","IDXX", "PCAR","DDOG","WBD","ROST","PAYX","BKR","ZS","TTWO","TEAM","CPRT", "EXC","EA","XEL","CCEP","FANG","CSGP","KDP","CHTR","MCHP","GEHC", "VRSK","CTSH","KHC","ODFL","DXCM","TTD","CDW","BIIB","ON","LULU","GFS" ]
 
 YEARS_BACK = 10
-SLEEP_BETWEEN_CALLS = 0.15
 
 METRICS = [
     "Revenues","NetIncomeLoss","EarningsPerShareBasic","EarningsPerShareDiluted",
@@ -45,19 +76,20 @@ DEFAULT_UNIT = "USD"
 # --------------- HELPERS ---------------
 def load_cik_map(cache: str = "company_tickers.json") -> Dict[str, str]:
     if not os.path.exists(cache):
-        r = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        r = SESSION.get(SEC_TICKER_URL, timeout=30)
         r.raise_for_status()
         with open(cache, "w") as f:
             f.write(r.text)
     with open(cache, "r") as f:
         data = json.load(f)
-    return {d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()}
+    return {d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()}
 
 def fetch_concept_rows(cik: str, tag: str) -> Iterable[Dict[str, Any]]:
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
     for attempt in range(3):
         try:
-            r = requests.get(url, headers=HEADERS, timeout=30)
+            _throttle()
+            r = SESSION.get(url, timeout=30)
             if r.status_code == 200:
                 js = r.json()
                 for uom, rows in (js.get("units") or {}).items():
@@ -137,9 +169,11 @@ def substitute_missing_value(metric: str, row: Dict[str, Any]) -> Tuple[Optional
         return None, None
 
     # --- Call choose_revenue_substitute robustly ---
+    # pass the hashable cik, not the row dict: the chooser is memoized per
+    # (CIK, metric) and a dict argument can't be used as a cache key
     raw_alt = None
     try:
-        raw_alt = choose_revenue_substitute(row, metric)
+        raw_alt = choose_revenue_substitute(cik, metric)
     except TypeError:
         try:
             raw_alt = choose_revenue_substitute(metric, row)
@@ -210,6 +244,54 @@ def substitute_missing_value(metric: str, row: Dict[str, Any]) -> Tuple[Optional
     return val, alt_tag  # val may still be None, but tag is known
 
 # --------------- MAIN ---------------
+def collect_ticker(tkr: str, cik: str, start_fy: int) -> List[Dict[str, Any]]:
+    """Fetch every metric for one ticker and return its finished filing rows."""
+    filing_rows: Dict[str, Dict[str, Any]] = {}
+
+    for metric in METRICS:
+        rows = list(filter_metric_rows(metric, fetch_concept_rows(cik, metric), start_fy))
+
+        # Keep latest 'filed' per accn: one C-level sort by (accn, filed),
+        # then the last row of each accn group is the latest-filed one
+        rows = [r for r in rows if r.get("accn")]
+        rows.sort(key=lambda r: (r["accn"], r.get("filed") or ""))
+        by_accn: Dict[str, Dict[str, Any]] = {
+            accn: list(g)[-1]
+            for accn, g in itertools.groupby(rows, key=lambda r: r["accn"])
+        }
+
+        # Merge into filing_rows
+        for accn, r in by_accn.items():
+            row = filing_rows.setdefault(accn, {})
+            if "accn" not in row:
+                row.update(sec_row_common_fields(r))
+                row["ticker"] = tkr
+                row["cik"] = cik
+            v = r.get("val")
+            # keep numeric; everything else -> None (missing)
+            row[metric] = v if isinstance(v, (int, float)) else None
+
+    # Fill missing metrics using alternative tags
+    for accn, row in filing_rows.items():
+        for m in METRICS:
+            val = row.get(m, None)
+
+            if val is None:
+                sub_val, sub_source = substitute_missing_value(m, row)
+
+                # If we could get a numeric substitute, use it
+                if sub_val is not None:
+                    row[m] = sub_val
+
+                # Source: alternative tag if we have one, otherwise "missing"
+                row[m + "_source"] = sub_source or "missing"
+            else:
+                # Value came from primary SEC tag
+                row[m + "_source"] = "sec"
+
+    print(f"{tkr}: collected {len(filing_rows)} filings")
+    return list(filing_rows.values())
+
 def main():
     ticker2cik = load_cik_map()
     current_year = datetime.utcnow().year
@@ -217,72 +299,30 @@ def main():
 
     all_rows = []
 
-    for tkr in TICKERS:
-        cik = ticker2cik.get(tkr.upper())
-        if not cik:
-            print(f"CIK not found for {tkr}")
-            continue
-
-        filing_rows: Dict[str, Dict[str, Any]] = {}
-
-        for metric in METRICS:
-            rows = list(filter_metric_rows(metric, fetch_concept_rows(cik, metric), start_fy))
-
-            # Keep latest 'filed' per accn
-            by_accn: Dict[str, Dict[str, Any]] = {}
-            for r in rows:
-                accn = r.get("accn")
-                if not accn:
-                    continue
-                prev = by_accn.get(accn)
-                if (prev is None) or ((r.get("filed") or "") > (prev.get("filed") or "")):
-                    by_accn[accn] = r
-
-            # Merge into filing_rows
-            for accn, r in by_accn.items():
-                row = filing_rows.setdefault(accn, {})
-                if "accn" not in row:
-                    row.update(sec_row_common_fields(r))
-                    row["ticker"] = tkr
-                    row["cik"] = cik
-                v = r.get("val")
-                # keep numeric; everything else -> None (missing)
-                row[metric] = v if isinstance(v, (int, float)) else None
-
-            time.sleep(SLEEP_BETWEEN_CALLS)
-
-        # Fill missing metrics using alternative tags
-        for accn, row in filing_rows.items():
-            for m in METRICS:
-                val = row.get(m, None)
-
-                if val is None:
-                    sub_val, sub_source = substitute_missing_value(m, row)
-
-                    # If we could get a numeric substitute, use it
-                    if sub_val is not None:
-                        row[m] = sub_val
-
-                    # Source: alternative tag if we have one, otherwise "missing"
-                    row[m + "_source"] = sub_source or "missing"
-                else:
-                    # Value came from primary SEC tag
-                    row[m + "_source"] = "sec"
-
-            all_rows.append(row)
-
-        print(f"{tkr}: collected {len(filing_rows)} filings")
-
-    # Sort rows
-    all_rows.sort(
-        key=lambda x: (
-            x.get("ticker", ""),
-            x.get("fy") or 0,
-            x.get("fp") or "",
-            x.get("filed") or "",
-            x.get("form") or "",
-        )
-    )
+    # Tickers are independent and I/O-bound, so fan out; the token bucket keeps
+    # the combined request rate under the SEC limit.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {}
+        for tkr in TICKERS:
+            cik = ticker2cik.get(tkr.upper())
+            if not cik:
+                print(f"CIK not found for {tkr}")
+                continue
+            futures[pool.submit(collect_ticker, tkr, cik, start_fy)] = tkr
+
+        for fut in as_completed(futures):
+            all_rows.extend(fut.result())
+
+    # Sort rows — one C-level lexsort over a structured key array instead of
+    # building a Python tuple per row inside a lambda
+    if all_rows:
+        keys = np.array(
+            [(x.get("ticker", ""), x.get("fy") or 0, x.get("fp") or "",
+              x.get("filed") or "", x.get("form") or "") for x in all_rows],
+            dtype=[("ticker", "U10"), ("fy", "i4"), ("fp", "U4"),
+                   ("filed", "U10"), ("form", "U8")])
+        order = np.argsort(keys, order=("ticker", "fy", "fp", "filed", "form"))
+        all_rows = [all_rows[i] for i in order]
 
     # Fieldnames
     fieldnames = ["ticker","cik","fy","fp","form","filed","end","start","accn"]
@@ -292,15 +332,10 @@ def main():
 
     out_path = os.path.join(OUT_DIR, "all_tickers_facts_10y.csv")
 
-    def safe(v: Any) -> Any:
-        # Never write literal "null" – empty string for missing
-        return "" if v is None else v
-
-    with open(out_path, "w", newline="", encoding="utf-8") as fp:
-        w = csv.DictWriter(fp, fieldnames=fieldnames)
-        w.writeheader()
-        for r in all_rows:
-            w.writerow({k: safe(r.get(k)) for k in fieldnames})
+    # pandas' C-level CSV writer serializes the whole table in one call.
+    # Missing cells become "" (never literal "null").
+    df = pd.DataFrame(all_rows, columns=fieldnames)
+    df.to_csv(out_path, index=False, na_rep="")
 
     print(f"Saved ONE CSV: {out_path}  ({len(all_rows)} filings total)")
 
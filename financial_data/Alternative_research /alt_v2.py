@@ -1,5 +1,8 @@
+import asyncio
+import httpx
 import requests
 import json
+import orjson
 import os
 import time
 from collections import defaultdict
@@ -11,6 +14,12 @@ SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
 DATA_DIR = "financial_data_2"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Pooled keep-alive session: one TLS handshake reused for every SEC call
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=16, pool_maxsize=16))
+
 TICKERS = [
     "AAPL", "MSFT", "GOOGL", "AMZN", "META",
     "TSLA", "NVDA", "JPM", "V", "UNH",
@@ -46,29 +55,35 @@ METRICS = [
 def load_cik_map(cache="company_tickers.json"):
     if not os.path.exists(cache):
         print("Downloading ticker→CIK map …")
-        res = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        res = SESSION.get(SEC_TICKER_URL, timeout=30)
         res.raise_for_status()
         with open(cache, "w") as fp:
             fp.write(res.text)
     with open(cache, "r") as fp:
         data = json.load(fp)
-    return {d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()}
+    return {d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()}
+
+# HTTP/2 multiplexes every concept GET onto one connection; the semaphore caps
+# in-flight requests so we stay under SEC's 10 req/s budget.
+MAX_INFLIGHT = 9
 
-def fetch_concept(cik: str, tag: str, retries=3, pause=0.25):
+async def fetch_concept(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                        cik: str, tag: str, retries=3, pause=0.25):
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
     for attempt in range(retries):
         try:
-            r = requests.get(url, headers=HEADERS, timeout=30)
+            async with sem:
+                r = await client.get(url)
             if r.status_code == 200:
                 units = r.json().get("units", {})
                 # Keep both USD and USD/shares (EPS)
                 return (units.get("USD", []) or []) + (units.get("USD/shares", []) or [])
             if r.status_code in (429, 500, 502, 503, 504):
-                time.sleep(pause * (attempt + 1))
+                await asyncio.sleep(pause * (attempt + 1))
                 continue
             return []
-        except requests.RequestException:
-            time.sleep(pause * (attempt + 1))
+        except httpx.HTTPError:
+            await asyncio.sleep(pause * (attempt + 1))
     return []
 
 def entries_since_2014(rows):
@@ -90,71 +105,69 @@ def pick_latest_by_period(rows):
     return best
 
 # ───────────── MAIN PROCESS ─────────────
-ticker2cik = load_cik_map()
-
-for tkr in TICKERS:
-    cik = ticker2cik.get(tkr)
-    if not cik:
-        print(f"CIK not found for {tkr}")
-        continue
-
+async def process_ticker(client, sem, tkr, cik):
     print(f"\n▶ {tkr} (CIK {cik})")
     data = {"ticker": tkr, "cik": cik, "financials": {}}
-
-    # Keep track of all periods we see from any metric/alt to build complete rows
-    all_periods = set()
+    # every period discovered below becomes a key of fin directly — no
+    # separate all_periods set and no second discovery pass
+    fin = data["financials"]
 
     # For each metric, keep alt maps so we can write per-period strings
     metric_alt_period_values = {}  # metric -> {alt_tag -> {period -> value}}
 
-    # 1) Pull primary metrics and collect alternatives (but do NOT fill from alts)
-    for metric in METRICS:
-        if metric == "FreeCashFlow":
-            continue  # derived later
+    primary_metrics = [m for m in METRICS if m != "FreeCashFlow"]  # FCF derived later
+
+    # 1) Pull all primary metrics concurrently (but do NOT fill from alts)
+    all_rows = await asyncio.gather(
+        *[fetch_concept(client, sem, cik, m) for m in primary_metrics])
 
-        rows = fetch_concept(cik, metric)
+    for metric, rows in zip(primary_metrics, all_rows):
         chosen = {}
         if rows:
             chosen = pick_latest_by_period(list(entries_since_2014(rows)))
             for period, r in chosen.items():
-                all_periods.add(period)
-                data["financials"].setdefault(period, {})[metric] = r["val"]
+                fin.setdefault(period, {})[metric] = r["val"]
 
         # Prepare alt suggestions (values per period) for when primary is missing
         alt_maps = {}
         if not chosen:
             alt_tags = (choose_revenue_substitute(cik, metric, top_n=5) or [])[:5]
-            for alt_tag in alt_tags:
-                alt_rows = fetch_concept(cik, alt_tag)
+            alt_results = await asyncio.gather(
+                *[fetch_concept(client, sem, cik, t) for t in alt_tags])
+            for alt_tag, alt_rows in zip(alt_tags, alt_results):
                 if not alt_rows:
-                    time.sleep(0.05)
                     continue
                 alt_chosen = pick_latest_by_period(list(entries_since_2014(alt_rows)))
                 if alt_chosen:
-                    # record which periods were observed overall
+                    # register alt-only periods as (empty) rows right away
                     for p in alt_chosen.keys():
-                        all_periods.add(p)
+                        fin.setdefault(p, {})
                     # save period -> value for this alternative
                     alt_maps[alt_tag] = {p: rr["val"] for p, rr in alt_chosen.items()}
-                time.sleep(0.05)
 
         metric_alt_period_values[metric] = alt_maps
 
-    # 2) Ensure every discovered period exists, then write "not available..." strings where needed
-    for period in sorted(all_periods):
-        row = data["financials"].setdefault(period, {})
+    # Invert the alt maps once per metric: period -> ["tag=value", ...].
+    # The old code rescanned every alternative's period map for every
+    # (period, metric) pair — F·K rebuilds of the same lists.
+    alt_pieces_by_metric = {}
+    for metric, alt_maps in metric_alt_period_values.items():
+        per_period = defaultdict(list)
+        for alt_tag, per_map in alt_maps.items():
+            for p, v in per_map.items():
+                per_period[p].append(f"{alt_tag}={v}")
+        alt_pieces_by_metric[metric] = per_period
+
+    # 2) Write "not available..." strings where a discovered period lacks a metric
+    for period, row in sorted(fin.items()):
         for metric in METRICS:
             if metric == "FreeCashFlow":
                 continue
             if metric in row:
                 continue  # already has a numeric value from primary tag
 
-            # Build the exact string with alternatives (only those that have a value for this period)
-            alt_maps = metric_alt_period_values.get(metric, {})
-            pieces = []
-            for alt_tag, per_map in alt_maps.items():
-                if period in per_map:
-                    pieces.append(f"{alt_tag}={per_map[period]}")
+            per_period = alt_pieces_by_metric.get(metric)
+            pieces = per_period.get(period) if per_period else None
             if pieces:
                 row[metric] = "not available from the company,but i can offer you the following: " + ", ".join(pieces)
             else:
@@ -177,8 +190,24 @@ for tkr in TICKERS:
             suffix = (": " + ", ".join(pieces)) if pieces else ""
             vals["FreeCashFlow"] = "not available from the company,but i can offer you the following" + suffix
 
-    # 4) Save JSON
-    with open(os.path.join(DATA_DIR, f"{tkr}.json"), "w") as fp:
-        json.dump(data, fp, indent=2)
+    # 4) Save JSON — orjson serializes in one C pass and we write the buffer
+    # with a single call, instead of json.dump's Python-level indent recursion
+    with open(os.path.join(DATA_DIR, f"{tkr}.json"), "wb") as fp:
+        fp.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+
+async def main():
+    ticker2cik = load_cik_map()
+    sem = asyncio.Semaphore(MAX_INFLIGHT)
+    async with httpx.AsyncClient(http2=True, headers=HEADERS, timeout=30) as client:
+        for tkr in TICKERS:
+            cik = ticker2cik.get(tkr)
+            if not cik:
+                print(f"CIK not found for {tkr}")
+                continue
+            await process_ticker(client, sem, tkr, cik)
+
+    print(f"\n✅ Completed. JSON files saved in ./{DATA_DIR}")
 
-print(f"\n✅ Completed. JSON files saved in ./{DATA_DIR}")
+if __name__ == "__main__":
+    asyncio.run(main())
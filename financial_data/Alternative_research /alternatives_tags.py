@@ -1,7 +1,8 @@
+import asyncio
 import requests
-import json
+import aiohttp
+import orjson
 import os
-import time
 from collections import defaultdict
 from cosine_similarity_selection import choose_revenue_substitute
 
@@ -11,6 +12,12 @@ SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
 DATA_DIR = "financial_data_2"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Keep-alive session: reuse one pooled connection for every SEC call
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=16, pool_maxsize=32))
+
 TICKERS = [
     "AAPL", "MSFT", "GOOGL", "AMZN", "META",
     "TSLA", "NVDA", "JPM", "V", "UNH",
@@ -49,25 +56,53 @@ METRICS = [
 def load_cik_map(cache="company_tickers.json"):
     if not os.path.exists(cache):
         print("Downloading ticker→CIK map …")
-        res = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        res = SESSION.get(SEC_TICKER_URL, timeout=30)
         res.raise_for_status()
         with open(cache, "w") as fp:
             fp.write(res.text)
-    with open(cache, "r") as fp:
-        data = json.load(fp)
+    with open(cache, "rb") as fp:
+        data = orjson.loads(fp.read())
     return {
-        d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()
+        d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()
     }
 
 
-def fetch_concept(cik: str, tag: str):
+# Concurrency cap: stays under SEC's ~10 req/s budget even when a whole
+# metric batch goes out at once
+MAX_INFLIGHT = 8
+
+
+async def fetch_concept(session, sem, cik: str, tag: str,
+                        max_attempts: int = 5, pause: float = 0.25):
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    if r.status_code != 200:
-        return []
-    units = r.json().get("units", {})
-    # Combine USD *and* USD/shares so metrics are not lost
-    return units.get("USD", []) + units.get("USD/shares", [])
+    for attempt in range(max_attempts):
+        try:
+            async with sem:
+                async with session.get(url) as r:
+                    if r.status == 200:
+                        # orjson parses the multi-megabyte concept responses
+                        # several times faster than the stdlib decoder
+                        units = orjson.loads(await r.read()).get("units", {})
+                        # Combine USD *and* USD/shares so metrics are not lost
+                        return units.get("USD", []) + units.get("USD/shares", [])
+                    if r.status in (429, 503):
+                        # The SEC tells us exactly when to come back — honor it
+                        # instead of hammering the rate limit
+                        retry_after = r.headers.get("Retry-After")
+                        if retry_after and retry_after.isdigit():
+                            await asyncio.sleep(int(retry_after))
+                        else:
+                            await asyncio.sleep(pause * (2 ** attempt))
+                        continue
+                    return []
+        except aiohttp.ClientError:
+            await asyncio.sleep(pause * (2 ** attempt))
+    return []
+
+
+def _write_json(path, data):
+    with open(path, "wb") as fp:
+        fp.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
 
 
 def entries_since_2014(entries):
@@ -79,21 +114,17 @@ def entries_since_2014(entries):
 
 # ───────────── MAIN PROCESS ─────────────
 
-ticker2cik = load_cik_map()
-missing = defaultdict(list)
-
-for tkr in TICKERS:
-    cik = ticker2cik.get(tkr)
-    if not cik:
-        print(f"CIK not found for {tkr}")
-        continue
-
+async def process_ticker(session, sem, tkr, cik, missing):
     print(f"\n▶ {tkr} (CIK {cik})")
     data = {"ticker": tkr, "cik": cik, "financials": {}}
 
-    for metric in METRICS:
+    # every primary metric for this ticker goes out in one concurrent batch —
+    # wall time is one round-trip instead of len(METRICS) of them
+    all_rows = await asyncio.gather(
+        *[fetch_concept(session, sem, cik, m) for m in METRICS])
+
+    for metric, rows in zip(METRICS, all_rows):
         found = False
-        rows = fetch_concept(cik, metric)
         if rows:
             found = True
             for r in entries_since_2014(rows):
@@ -104,15 +135,17 @@ for tkr in TICKERS:
             # If the metric is not found, find alternatives using the similarity function
             print(f"▶ {metric} not found, checking alternatives …")
             similar_tags = choose_revenue_substitute(cik, metric, top_n=5)
-            for alt_tag in similar_tags:
-                rows = fetch_concept(cik, alt_tag)
+            # fetch all candidates at once, then keep ranked order by taking
+            # the first that actually returned rows
+            alt_rows = await asyncio.gather(
+                *[fetch_concept(session, sem, cik, t) for t in similar_tags])
+            for alt_tag, rows in zip(similar_tags, alt_rows):
                 if rows:
                     found = True
                     for r in entries_since_2014(rows):
                         period = r["end"]
                         data["financials"].setdefault(period, {})[metric] = r["val"]
                     break
-                time.sleep(0.25)
 
             if not found:
                 missing[tkr].append(metric)
@@ -126,16 +159,37 @@ for tkr in TICKERS:
         else:
             missing[tkr].append("FreeCashFlow")
 
-    with open(os.path.join(DATA_DIR, f"{tkr}.json"), "w") as fp:
-        json.dump(data, fp, indent=2)
+    # dump + write on a worker thread: the event loop can start the next
+    # ticker's requests instead of stalling on disk
+    await asyncio.to_thread(_write_json, os.path.join(DATA_DIR, f"{tkr}.json"), data)
+
+
+async def main():
+    ticker2cik = load_cik_map()
+    missing = defaultdict(list)
+    sem = asyncio.Semaphore(MAX_INFLIGHT)
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=10)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout,
+                                     connector=connector) as session:
+        for tkr in TICKERS:
+            cik = ticker2cik.get(tkr)
+            if not cik:
+                print(f"CIK not found for {tkr}")
+                continue
+            await process_ticker(session, sem, tkr, cik, missing)
+
+    # ───────────── REPORT ─────────────
+    print("\n===== Missing‑Tag Report =====")
+    for tkr in TICKERS:
+        miss = sorted(set(missing.get(tkr, [])))
+        if miss:
+            print(f"{tkr}: {', '.join(miss)}")
+        else:
+            print(f"{tkr}: All metrics present")
+
+    print("\n✅ Completed. JSON files saved in ./financial_data")
 
-# ───────────── REPORT ─────────────
-print("\n===== Missing‑Tag Report =====")
-for tkr in TICKERS:
-    miss = sorted(set(missing.get(tkr, [])))
-    if miss:
-        print(f"{tkr}: {', '.join(miss)}")
-    else:
-        print(f"{tkr}: All metrics present")
 
-print("\n✅ Completed. JSON files saved in ./financial_data")
+if __name__ == "__main__":
+    asyncio.run(main())
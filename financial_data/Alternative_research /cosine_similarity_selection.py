@@ -1,41 +1,97 @@
+import functools
+
+import numpy as np
+
+try:  # optional JIT'd dense kernel; the sparse BLAS path stays the fallback
+    import numba
+
+    @numba.njit(parallel=True, fastmath=True)
+    def _cosine_dense(A, B):
+        n, m = A.shape[0], B.shape[0]
+        out = np.zeros((n, m), dtype=np.float32)
+        for i in numba.prange(n):
+            na = np.sqrt((A[i] * A[i]).sum())
+            for j in range(m):
+                nb = np.sqrt((B[j] * B[j]).sum())
+                if na > 0.0 and nb > 0.0:
+                    out[i, j] = (A[i] * B[j]).sum() / (na * nb)
+        return out
+except ImportError:
+    numba = None
+
 from taxonomy_loader import taxo_texts
 from tags_list import tags_list
 from sklearn.feature_extraction.text import  TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import Optional
 from helper import _normalize
 
 
 # ───────── COSINE SIMILARITY SELECTION ——————————————————————————
 
-def choose_revenue_substitute(CIK,target_label,top_n: int = 5) -> Optional[str]:
+@functools.lru_cache(maxsize=1)
+def _taxonomy_matrix():
+    """Fit TF-IDF over the whole taxonomy ONCE; callers just slice rows.
+
+    Refitting a fresh vectorizer per (ticker, metric) call meant thousands of
+    fits of nearly identical corpora — this makes each call a cache hit plus
+    one small similarity computation.
+    """
     texts = taxo_texts()
-    reported = tags_list(CIK)
-    #target_label = target_label
-    target_label = texts[target_label]
-     #1) What string will stand in for the *missing* target?
-    #if "Revenues" in texts:
-        #target_label = texts["Revenues"]
-    #elif "RevenueFromContractWithCustomerExcludingAssessedTax" in texts:
-        #target_label = texts["RevenueFromContractWithCustomerExcludingAssessedTax"]
-    #else:
-        #raise RuntimeError("No target revenue concept found in taxonomy texts.")
-
-    corpus   = [_normalize(target_label)]
-    tag_list = []
-    for t in reported:
-        if t in texts:
-            corpus.append(_normalize(texts[t]))
-            tag_list.append(t)
+    tags  = sorted(texts)
+    # char_wb n-grams cope with the CamelCase GAAP concatenations much better
+    # than word unigrams; float32 halves the matrix memory, and the L2 norm
+    # keeps cosine equal to a plain dot product.
+    vec   = TfidfVectorizer(analyzer="char_wb", ngram_range=(4, 7),
+                            sublinear_tf=True, norm="l2",
+                            dtype=np.float32, max_features=250000, min_df=1)
+    M     = vec.fit_transform(_normalize(texts[t]) for t in tags)
+    return vec, {t: i for i, t in enumerate(tags)}, M
+
+
+@functools.lru_cache(maxsize=256)
+def _reported_rows(CIK):
+    """Reported-tags ∩ taxonomy overlap plus its TF-IDF candidate rows.
 
+    Computed once per CIK and reused for every metric, instead of redoing the
+    membership filter and matrix slicing on each call.
+    """
+    _, idx, M = _taxonomy_matrix()
+    keep = [t for t in tags_list(CIK) if t in idx]
+    return keep, (M[[idx[t] for t in keep]] if keep else None)
+
+
+@functools.lru_cache(maxsize=4096)
+def choose_revenue_substitute(CIK,target_label,top_n: int = 5) -> Optional[str]:
+    # Memoized per (CIK, target_label, top_n): the extractors ask for the
+    # same substitute once per (ticker, metric) miss across many FYs, and
+    # the ranking never changes within a run.
+    vec, idx, M = _taxonomy_matrix()
+
+    if target_label not in idx:
+        print(f"Target tag '{target_label}' not found in taxonomy texts.")
+        return None
+
+    tag_list, cands = _reported_rows(CIK)
     if len(tag_list) == 0:
         print("No overlapping tags between Apple-reported set and taxonomy texts.")
         return None
 
-    vec  = TfidfVectorizer().fit_transform(corpus)
-    sims = cosine_similarity(vec[0:1], vec[1:]).ravel()
+    # TfidfVectorizer rows are already L2-normalized, so cosine similarity is a
+    # plain dot product — one sparse CSR matmul instead of per-target calls.
+    target = M[idx[target_label]]
+    if numba is not None and cands.nnz / (cands.shape[0] * cands.shape[1]) > 0.2:
+        # dense enough that the parallel JIT kernel beats the sparse matmul
+        sims = _cosine_dense(target.toarray().astype(np.float32),
+                             cands.toarray().astype(np.float32)).ravel()
+    else:
+        sims = (target @ cands.T).toarray().ravel()
 
-    ranking = sorted(zip(tag_list, sims), key=lambda x: x[1], reverse=True)[:top_n+1]
+    # C-level partial selection: argpartition picks the top n+1, then only
+    # those few indices get sorted — no full O(N log N) Python sort.
+    n = min(top_n + 1, sims.size)
+    top_idx = np.argpartition(-sims, n - 1)[:n]
+    top_idx = top_idx[np.argsort(-sims[top_idx])]
+    ranking = [(tag_list[i], float(sims[i])) for i in top_idx]
 
     print(f"\nTop semantic matches to missing tag concept ({CIK}) — COSINE")
     print("──────────────────────────────────────────────────────────────────")
@@ -45,6 +101,12 @@ def choose_revenue_substitute(CIK,target_label,top_n: int = 5) -> Optional[str]:
         if i<6:
               print(f"{i}. {tag:<60}  similarity = {sc:.3f}")
     print("──────────────────────────────────────────────────────────────────")
-    print(f"Chosen substitute → {(ranking[0][0] if ranking[0][1] < 1.0 else ranking[1][0])}" if ranking else "No candidate found.")
-    return ranking[0][0] if ranking[0][1] < 1.0 else ranking[1][0]
+    if not ranking:
+        print("No candidate found.")
+        return None
+    # evaluate the pick once instead of repeating the conditional in the
+    # print and the return
+    chosen = ranking[0][0] if ranking[0][1] < 1.0 else ranking[1][0]
+    print(f"Chosen substitute → {chosen}")
+    return chosen
     #return ranking if ranking else None
\ No newline at end of file
@@ -1,23 +1,74 @@
 from pathlib import Path
-import  re, string, time, unicodedata
+import  functools, json, os, pickle, re, string, time, unicodedata
+import requests
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 from typing import List
 
 HEADERS      = {"User-Agent": "eng.sultan.fadi@gmail.com (semantic-revenue-finder)"}
+CACHE_DIR    = Path("../.cache"); CACHE_DIR.mkdir(exist_ok=True)
+
+def disk_cache(name: str):
+    """Memoize a function's return value to .cache/<name>[_args].pkl.
+
+    Warm reruns then skip the download+parse entirely and load the derived
+    dict in milliseconds. Delete the .pkl (or change `name`, e.g. by baking
+    the taxonomy year into it) to invalidate.
+    """
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = "_".join(str(a) for a in args)
+            fp = CACHE_DIR / (f"{name}_{key}.pkl" if key else f"{name}.pkl")
+            if fp.exists():
+                return pickle.loads(fp.read_bytes())
+            out = fn(*args)
+            fp.write_bytes(pickle.dumps(out, pickle.HIGHEST_PROTOCOL))
+            return out
+        return wrapper
+    return deco
 
 def _dl(url: str, fp: Path) -> None:
-    """Download-and-cache helper: fetch only if missing; write atomically."""
+    """Download-and-cache helper with conditional revalidation.
+
+    A sibling .meta.json stores the server's ETag/Last-Modified; once a file
+    is cached with validators we revalidate with If-None-Match /
+    If-Modified-Since, so an unchanged file costs one 304 round-trip instead
+    of a full re-download.
+    """
+    meta_fp = fp.with_suffix(fp.suffix + ".meta.json")
+    headers = dict(HEADERS)
     if fp.exists():
-        return
-    r = requests.get(url, headers=HEADERS, timeout=30)
+        if not meta_fp.exists():
+            return  # no validators stored — trust the cached copy
+        meta = json.loads(meta_fp.read_text())
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    r = requests.get(url, headers=headers, timeout=30)
+    if r.status_code == 304:
+        return  # cache is still current
     r.raise_for_status()
-    fp.write_bytes(r.content)
+    # write via a temp file + os.replace so an interrupted download can never
+    # leave a half-written cache entry behind
+    tmp = fp.with_suffix(fp.suffix + ".tmp")
+    tmp.write_bytes(r.content)
+    os.replace(tmp, fp)
+    meta_fp.write_text(json.dumps({
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+    }))
     time.sleep(0.25)  # be polite to remote servers
+# compiled once — _normalize sits on the similarity hot path and the old
+# dynamically built pattern re-entered the regex cache on every call
+_PUNCT_RE = re.compile(f"[{re.escape(string.punctuation)}]")
+_STOP = frozenset(ENGLISH_STOP_WORDS)
+
 def _normalize(txt: str) -> str:
     """Lowercase, strip punctuation, remove stopwords, canonicalize synonyms."""
     txt = unicodedata.normalize("NFKD", txt).lower()
-    txt = re.sub(f"[{re.escape(string.punctuation)}]", " ", txt)
-    return " ".join(w for w in txt.split() if w not in ENGLISH_STOP_WORDS)
+    txt = _PUNCT_RE.sub(" ", txt)
+    return " ".join(w for w in txt.split() if w not in _STOP)
 def _tokenize_positions(text: str) -> List[str]:
     """Normalize + return token list with positions as indices."""
     return _normalize(text).split()
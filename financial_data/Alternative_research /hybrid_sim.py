@@ -1,9 +1,11 @@
+import heapq
+
 from helper import _tokenize_positions,_normalize
 from typing import Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
 from taxonomy_loader import taxo_texts
 from tags_list import tags_list
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.metrics.pairwise import linear_kernel
 from proximity_similarity import proximity_score
 
 def choose_revenue_substitute_hybrid(top_n: int = 5, alpha: float = 0.6) -> Optional[str]:
@@ -29,7 +31,8 @@ def choose_revenue_substitute_hybrid(top_n: int = 5, alpha: float = 0.6) -> Opti
         return None
 
     vec  = TfidfVectorizer().fit_transform(corpus)
-    sims = cosine_similarity(vec[0:1], vec[1:]).ravel()
+    # rows are L2-normalized already, so the dot product IS the cosine score
+    sims = linear_kernel(vec[0:1], vec[1:]).ravel()
 
     prox_scores = [proximity_score(texts[tag]) for tag in tag_list]
 
@@ -38,7 +41,7 @@ def choose_revenue_substitute_hybrid(top_n: int = 5, alpha: float = 0.6) -> Opti
         score = alpha * float(csc) + (1.0 - alpha) * float(psc)
         blended.append((tag, score, csc, psc))
 
-    ranked = sorted(blended, key=lambda x: x[1], reverse=True)[:top_n]
+    ranked = heapq.nlargest(top_n, blended, key=lambda x: x[1])
 
     print("\nTop HYBRID matches to revenue cues (Apple) — HYBRID")
     print("────────────────────────────────────────────────────")
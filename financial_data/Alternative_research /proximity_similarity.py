@@ -1,3 +1,5 @@
+import heapq
+
 from helper import _tokenize_positions
 from typing import Optional
 from taxonomy_loader import taxo_texts
@@ -8,8 +10,8 @@ def proximity_score(text: str) -> float:
     Proximity similarity in [0,1].
     Backed off to a frequency score: count / (count + 5).
     """
-    tokens = _tokenize_positions(text)
-    count = sum(1 for t in tokens)
+    # only the token count is needed, so len() replaces the generator sum
+    count = len(_tokenize_positions(text))
     return count / (count + 5.0)
 
 def choose_revenue_substitute_proximity(CIK,top_n: int = 5) -> Optional[str]:
@@ -32,7 +34,7 @@ def choose_revenue_substitute_proximity(CIK,top_n: int = 5) -> Optional[str]:
         s = proximity_score(txt)
         scored.append((tag, s))
 
-    ranked = sorted(scored, key=lambda x: x[1], reverse=True)[:top_n]
+    ranked = heapq.nlargest(top_n, scored, key=lambda x: x[1])
 
     print("\nTop proximity matches to revenue cues (Apple) — PROXIMITY")
     print("───────────────────────────────────────────────────────────")
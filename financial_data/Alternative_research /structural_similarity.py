@@ -1,4 +1,36 @@
+import functools
+import pickle
 from collections import defaultdict, deque
+from pathlib import Path
+
+import numpy as np
+
+try:  # optional JIT'd distance kernel; the NumPy path stays the fallback
+    import numba
+
+    @numba.njit(cache=True)
+    def _rmq_dists_nb(ft, idx, known, st, euler_depth):
+        n = idx.shape[0]
+        out = np.full(n, np.inf)
+        dt = euler_depth[ft]
+        for i in range(n):
+            if not known[i]:
+                continue
+            l = ft if ft < idx[i] else idx[i]
+            r = ft if ft > idx[i] else idx[i]
+            length = r - l + 1
+            k = 0
+            while (1 << (k + 1)) <= length:
+                k += 1
+            a = st[k, l]
+            b = st[k, r - (1 << k) + 1]
+            d = euler_depth[a] if euler_depth[a] <= euler_depth[b] else euler_depth[b]
+            if d > 0:  # depth 0 = virtual root = no common tree
+                out[i] = dt + euler_depth[idx[i]] - 2 * d
+        return out
+except ImportError:
+    numba = None
+
 from taxonomy_loader import taxo_texts
 from tags_list import tags_list
 from typing import Optional
@@ -8,139 +40,368 @@ from arelle import Cntlr, XbrlConst
 # ── UNIVERSAL GAAP‑2024 PRESENTATION FOREST ─────────────────────────────────────────────────
 ENTRY_XSD = "/Users/fadisultan/Downloads/us-gaap-2025/entire/us-gaap-entryPoint-all-2025.xsd"
 
-cntlr = Cntlr.Cntlr()
-model_xbrl = cntlr.modelManager.load(ENTRY_XSD)
-pres = model_xbrl.relationshipSet(XbrlConst.parentChild)
+# The forest is deterministic for a given taxonomy year, so serialize it
+# once and skip the multi-minute Arelle load on every later run.
+TAXO_YEAR = ENTRY_XSD.rsplit("-", 1)[-1].split(".")[0]
+CACHE_DIR = Path(".taxonomy_cache"); CACHE_DIR.mkdir(exist_ok=True)
+FOREST_PKL = CACHE_DIR / f"forest_{TAXO_YEAR}.pkl"
 
-# all link‑roles present
-roles = {rel.linkrole for rel in pres.modelRelationships}
-print("presentation networks:", len(roles))  # Check number of roles
 
+def _build_forest():
+    """Load the taxonomy with Arelle and flatten it into the forest + SoA maps."""
+    cntlr = Cntlr.Cntlr()
+    model_xbrl = cntlr.modelManager.load(ENTRY_XSD)
+    pres = model_xbrl.relationshipSet(XbrlConst.parentChild)
 
-# helper: roots = parents that are never children in that role
-def roots_for_role(role_uri):
-    parents, children = set(), set()
+    # Single pass over the relationship set: group edges by link-role once instead
+    # of rescanning every relationship for every role (which was O(roles × edges)).
+    rels_by_role = defaultdict(list)
     for rel in pres.modelRelationships:
-        if rel.linkrole == role_uri:
-            parents.add(rel.fromModelObject)
-            children.add(rel.toModelObject)
-    return list(parents - children)  # Parents that are not children of any other concept
-
-
-# Build the forest
-forest = defaultdict(list)
-
-for role in roles:
-    roots = roots_for_role(role)
-    nodes = {c: {"id": str(c.qname),
-                 "label": c.label(lang="en") or str(c.qname),
-                 "children": []}
-             for c in roots}
-
-    q = deque(roots)
-    while q:
-        parent = q.popleft()  # get the parent
-        for rel in pres.fromModelObject(parent):
-            if rel.linkrole != role:
-                continue
-            child = rel.toModelObject
-            if child not in nodes:
-                nodes[child] = {"id": str(child.qname),
-                                "label": child.label(lang="en") or str(child.qname),
-                                "children": []}
-            nodes[parent]["children"].append(nodes[child])
-            q.append(child)
-
-    forest[role] = [nodes[r] for r in roots]
+        rels_by_role[rel.linkrole].append(rel)
+    print("presentation networks:", len(rels_by_role))  # Check number of roles
+
+    # Build the forest, plus flat SoA maps keyed by the local tag name (the
+    # form used by taxo_texts/tags_list downstream). The nested node dicts are
+    # kept for display; traversals use the flat maps and skip the pointer
+    # chases through {"id","label","children"} entirely.
+    forest = defaultdict(list)
+    children_by_tag = defaultdict(list)
+    parent_by_tag = {}
+    depth_by_tag = {}  # roots at 0, set once on first visit
+    label_to_network = {}  # lowercased label -> containing network root
+    seen_edges = set()
+
+    for role, rels in rels_by_role.items():
+        parents = {rel.fromModelObject for rel in rels}
+        children = {rel.toModelObject for rel in rels}
+        roots = list(parents - children)  # Parents that are not children of any other concept
+
+        # adjacency for this role only — each edge is touched exactly once
+        children_of = defaultdict(list)
+        for rel in rels:
+            children_of[rel.fromModelObject].append(rel.toModelObject)
+
+        nodes = {c: {"id": str(c.qname),
+                     "label": c.label(lang="en") or str(c.qname),
+                     "children": []}
+                 for c in roots}
+        for c in roots:
+            depth_by_tag.setdefault(str(c.qname).split(":")[-1], 0)
+        owner = {c: nodes[c] for c in roots}  # node -> its network root
+
+        q = deque(roots)
+        while q:
+            parent = q.popleft()  # get the parent
+            for child in children_of.get(parent, ()):
+                first_visit = child not in nodes
+                if first_visit:
+                    nodes[child] = {"id": str(child.qname),
+                                    "label": child.label(lang="en") or str(child.qname),
+                                    "children": []}
+                nodes[parent]["children"].append(nodes[child])
+                ptag = str(parent.qname).split(":")[-1]
+                ctag = str(child.qname).split(":")[-1]
+                if (ptag, ctag) not in seen_edges:
+                    seen_edges.add((ptag, ctag))
+                    children_by_tag[ptag].append(ctag)
+                    parent_by_tag.setdefault(ctag, ptag)
+                if ctag not in depth_by_tag:
+                    depth_by_tag[ctag] = depth_by_tag.get(ptag, 0) + 1
+                if first_visit:  # enqueue each node once, never re-walk its subtree
+                    owner[child] = owner[parent]
+                    q.append(child)
+
+        # index every node's label (not just the top level) for O(1) lookup
+        for obj, nd in nodes.items():
+            label_to_network.setdefault(nd["label"].strip().lower(), owner[obj])
+
+        forest[role] = [nodes[r] for r in roots]
+
+    return forest, children_by_tag, parent_by_tag, depth_by_tag, label_to_network
+
+
+if FOREST_PKL.exists():
+    with open(FOREST_PKL, "rb") as f:
+        _cached = pickle.load(f)
+    forest = _cached["forest"]
+    children_by_tag = _cached["children"]
+    parent_by_tag = _cached["parent"]
+    depth_by_tag = _cached["depth"]
+    label_to_network = _cached["label_idx"]
+    print(f"forest loaded from {FOREST_PKL}")
+else:
+    forest, children_by_tag, parent_by_tag, depth_by_tag, label_to_network = _build_forest()
+    with open(FOREST_PKL, "wb") as f:
+        pickle.dump({"forest": forest, "children": children_by_tag,
+                     "parent": parent_by_tag, "depth": depth_by_tag,
+                     "label_idx": label_to_network},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
 
 print("forest built with",
       sum(len(v) for v in forest.values()), "top‑level nodes across",
       len(forest), "networks")
 
 
+# ── ANCESTOR BITSETS ────────────────────────────────────────────────────────
+# O(10k) tags is small enough that every tag's ancestor set fits in a few
+# hundred uint64 words. Ids are assigned in depth order, so along any
+# root-to-node path ids strictly increase with depth — the deepest common
+# ancestor of two tags is therefore just the highest bit of the ANDed masks.
+_TAGS_BY_DEPTH = sorted(depth_by_tag, key=depth_by_tag.get)
+_TAG_ID = {t: i for i, t in enumerate(_TAGS_BY_DEPTH)}
+_N_TAGS = len(_TAG_ID)
+_N_WORDS = (_N_TAGS + 63) // 64
+_ANC_MASK = np.zeros((_N_TAGS, _N_WORDS), dtype=np.uint64)
+_DEPTH_BY_ID = np.zeros(_N_TAGS, dtype=np.int32)
+for _tag in _TAGS_BY_DEPTH:
+    _i = _TAG_ID[_tag]
+    _p = parent_by_tag.get(_tag)
+    if _p is not None and _p in _TAG_ID:
+        _ANC_MASK[_i] = _ANC_MASK[_TAG_ID[_p]]
+    _ANC_MASK[_i, _i >> 6] |= np.uint64(1) << np.uint64(_i & 63)
+    _DEPTH_BY_ID[_i] = depth_by_tag[_tag]
+
+
+def _highest_bit_index(words):
+    """Per-row index of the highest set bit in an (m, W) uint64 bitset.
+
+    Branchless SWAR: smear the top bit rightwards, then popcount gives
+    highest-bit index + 1. Rows with no set bit come back as -1.
+    """
+    m, W = words.shape
+    out = np.full(m, -1, dtype=np.int64)
+    for w in range(W - 1, -1, -1):
+        col = words[:, w]
+        todo = (out < 0) & (col != 0)
+        if not todo.any():
+            continue
+        x = col[todo]
+        for s in (1, 2, 4, 8, 16, 32):
+            x = x | (x >> np.uint64(s))
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + \
+            ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        pc = (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+        out[todo] = w * 64 + pc.astype(np.int64) - 1
+    return out
+
+
+# ── EULER TOUR + SPARSE-TABLE RMQ ────────────────────────────────────────────
+def lca_preprocess(forest):
+    """Flatten the forest into an Euler tour and build a sparse table.
+
+    One O(n) pass gives `euler` (tag per tour step), `depth` per step and
+    each tag's first occurrence; the doubling table then answers any
+    range-min — and therefore any LCA — in O(1). A virtual super-root
+    (None, depth 0) separates the trees so cross-tree queries surface as
+    "no common ancestor" instead of a bogus LCA.
+    """
+    euler_tags = [None]
+    euler_depth = [0]
+    first = {}
+
+    def record(tag, d):
+        if tag not in first:
+            first[tag] = len(euler_tags)
+        euler_tags.append(tag)
+        euler_depth.append(d)
+
+    for networks in forest.values():
+        for root in networks:
+            tag = root["id"].split(":")[-1]
+            fresh = tag not in first
+            record(tag, 1)
+            if not fresh:
+                continue
+            stack = [(root, 1, iter(root["children"]))]
+            while stack:
+                node, d, kids = stack[-1]
+                child = next(kids, None)
+                if child is None:
+                    stack.pop()
+                    if stack:
+                        pnode, pd, _ = stack[-1]
+                        record(pnode["id"].split(":")[-1], pd)
+                else:
+                    ctag = child["id"].split(":")[-1]
+                    fresh = ctag not in first
+                    record(ctag, d + 1)
+                    # the presentation graph can share subtrees between
+                    # parents; descend only on the first encounter so the
+                    # tour stays linear in the number of tags
+                    if fresh:
+                        stack.append((child, d + 1, iter(child["children"])))
+            euler_tags.append(None)  # tree separator
+            euler_depth.append(0)
+
+    depth_arr = np.asarray(euler_depth, dtype=np.int32)
+    n = depth_arr.size
+    k_levels = max(1, int(n).bit_length())
+    st = np.empty((k_levels, n), dtype=np.int64)
+    st[0] = np.arange(n)
+    for k in range(1, k_levels):
+        off = 1 << (k - 1)
+        prev = st[k - 1]
+        nxt = prev.copy()
+        m = n - (1 << k) + 1
+        if m > 0:
+            left = prev[:m]
+            right = prev[off:off + m]
+            nxt[:m] = np.where(depth_arr[right] < depth_arr[left], right, left)
+        st[k] = nxt
+    return euler_tags, depth_arr, first, st
+
+
+_EULER_TAGS, _EULER_DEPTH, _FIRST, _ST = lca_preprocess(forest)
+
+
+def _rmq(l, r):
+    """Index of the minimum-depth tour step in [l, r] — O(1)."""
+    if l > r:
+        l, r = r, l
+    k = (r - l + 1).bit_length() - 1
+    a = _ST[k, l]
+    b = _ST[k, r - (1 << k) + 1]
+    return a if _EULER_DEPTH[a] <= _EULER_DEPTH[b] else b
+
+
 # ── TREE TRAVERSAL FUNCTIONS ─────────────────────────────────────────────────
-def get_ancestors(tag, tree):
-    """Get all ancestors of a tag in the tree."""
+@functools.lru_cache(maxsize=None)
+def _ancestors_cached(tag):
+    """Tag plus all its ancestors as a tuple — computed once per tag."""
     ancestors = []
     current = tag
-    while current in tree:
+    while current is not None:
         ancestors.append(current)
-        current = tree.get(current, [None])[0]  # Get the parent (assuming the first parent)
-    return ancestors
-
-
-def find_lca(tag1, tag2, tree):
-    """Find the Lowest Common Ancestor (LCA) between two tags."""
-    ancestors1 = get_ancestors(tag1, tree)
-    ancestors2 = get_ancestors(tag2, tree)
-
-    # Find the common ancestors
-    common_ancestors = set(ancestors1).intersection(ancestors2)
+        current = parent_by_tag.get(current)  # first recorded parent
+    return tuple(ancestors)
 
-    # The LCA is the deepest common ancestor
-    for ancestor in ancestors1:
-        if ancestor in common_ancestors:
-            return ancestor
-    return None  # No common ancestor found
 
+def get_ancestors(tag, parents=None):
+    """Get the tag and all its ancestors, walking the flat parent map."""
+    if parents is None or parents is parent_by_tag:
+        return list(_ancestors_cached(tag))
+    ancestors = []
+    current = tag
+    while current is not None:
+        ancestors.append(current)
+        current = parents.get(current)
+    return ancestors
 
-def calculate_distance(tag1, tag2, tree):
-    """Calculate the distance between two tags based on LCA."""
-    lca = find_lca(tag1, tag2, tree)
-    if not lca:
-        return float('inf')  # No common ancestor, infinite distance
-
-    # Calculate the distance from tag1 and tag2 to the LCA
-    def distance_from_lca(tag, lca, tree):
-        distance = 0
-        current = tag
-        while current != lca:
-            current = tree.get(current, [None])[0]
-            distance += 1
-        return distance
-
-    distance_tag1 = distance_from_lca(tag1, lca, tree)
-    distance_tag2 = distance_from_lca(tag2, lca, tree)
 
-    return distance_tag1 + distance_tag2  # Total distance
+def _distances_to(target, tags):
+    """LCA distances from `target` to every tag in `tags`, vectorized.
+
+    One batched sparse-table lookup over all candidates — no Python-level
+    per-pair calls. Returns float distances with inf for tags outside the
+    forest or sharing no tree with the target.
+    """
+    out = np.full(len(tags), np.inf)
+    if not tags:
+        return out
+
+    if numba is not None:
+        ft = _FIRST.get(target)
+        if ft is None:
+            return out
+        idx = np.fromiter((_FIRST.get(t, -1) for t in tags),
+                          dtype=np.int64, count=len(tags))
+        known = idx >= 0
+        idx = np.where(known, idx, ft)  # dummy index for unknown tags
+        # pure integer index chasing — exactly the shape of loop the JIT
+        # removes all interpreter overhead from
+        return _rmq_dists_nb(ft, idx, known, _ST, _EULER_DEPTH)
+
+    # Bitset path: common ancestors of (target, candidate) is one AND per
+    # 64-tag word, and the deepest one is the highest common bit.
+    ti = _TAG_ID.get(target)
+    if ti is None:
+        return out
+    cid = np.fromiter((_TAG_ID.get(t, -1) for t in tags),
+                      dtype=np.int64, count=len(tags))
+    known = cid >= 0
+    cid = np.where(known, cid, ti)  # dummy id for unknown tags
+    common = _ANC_MASK[cid] & _ANC_MASK[ti]
+    lca_id = _highest_bit_index(common)
+    ok = known & (lca_id >= 0)  # empty AND = tags share no tree
+    lca_depth = _DEPTH_BY_ID[np.where(lca_id >= 0, lca_id, 0)]
+    dists = _DEPTH_BY_ID[ti] + _DEPTH_BY_ID[cid] - 2 * lca_depth
+    out[ok] = dists[ok]
+    return out
+
+
+def find_lca(tag1, tag2, tree=None):
+    """Find the Lowest Common Ancestor (LCA) between two tags.
+
+    O(1) per query: two first-occurrence lookups plus one sparse-table
+    range-min over the Euler tour. `tree` is kept for call-site
+    compatibility but no longer consulted.
+    """
+    i = _FIRST.get(tag1)
+    j = _FIRST.get(tag2)
+    if i is not None and j is not None:
+        return _EULER_TAGS[_rmq(i, j)]  # None when the tags share no tree
+    # Tag outside the tour: fall back to the cached ancestor tuples. One
+    # frozenset build plus a single scan — the tuples run leaf-to-root, so
+    # the first hit is already the deepest common ancestor.
+    anc2 = frozenset(_ancestors_cached(tag2))
+    for a in _ancestors_cached(tag1):
+        if a in anc2:
+            return a
+    return None
+
+
+def calculate_distance(tag1, tag2, tree=None):
+    """Distance between two tags: depth[u] + depth[v] - 2*depth[LCA].
+
+    Pure dict lookups and arithmetic against the depths recorded while the
+    forest was built — no walk of any kind per query.
+    """
+    lca = find_lca(tag1, tag2)
+    if lca is None:
+        return float('inf')  # no common ancestor, infinite distance
+    try:
+        return depth_by_tag[tag1] + depth_by_tag[tag2] - 2 * depth_by_tag[lca]
+    except KeyError:
+        return float('inf')
 
 
 def get_descendants(tag, tree):
-    """Get all descendants (subtree) of a given tag."""
-    descendants = []
+    """Get all descendants (subtree) of a given tag.
 
-    def recursive_traversal(current_tag):
-        children = tree.get(current_tag, [])
-        for child in children:
-            descendants.append(child)
-            recursive_traversal(child)  # Recursively get descendants
-
-    recursive_traversal(tag)
+    Iterative stack-based DFS — no interpreter frame per node and no risk
+    of hitting the recursion limit on deep taxonomy subtrees.
+    """
+    descendants = []
+    stack = [tag]
+    while stack:
+        children = tree.get(stack.pop(), ())
+        descendants.extend(children)
+        stack.extend(children)
     return descendants
 
 
 # ── MAIN FUNCTION TO GET THE NETWORK THAT CONTAINS THE TARGET LABEL ─────────────
-def get_network_for_target_label(target_label, forest):
-    """Get the network that contains the target label."""
-    for role, networks in forest.items():
-        for network in networks:
-            if isinstance(network, dict):
-                # Check if any node in the network contains the target label
-                for node in network["children"]:
-                    if node["label"].strip().lower() == target_label.strip().lower():
-                        print(f"Found '{target_label}' in the network for role {role}.")
-                        return network  # Return the network containing the target label
-    return None  # Return None if the target label is not found in any network
+def get_network_for_target_label(target_label, forest=None):
+    """Get the network that contains the target label.
+
+    O(1): the label index is filled while the forest is built and covers
+    every node, not just the top-level children the old scan checked.
+    """
+    return label_to_network.get(target_label.strip().lower())
 
 
 # ── MAIN FUNCTION TO FIND TOP N SIMILAR TAGS BASED ON DESCENDANTS ─────────────
 def choose_revenue_substitute_by_descendants(CIK, target_label, top_n=5) -> Optional[str]:
     """Choose structurally similar tags based on descendants in the taxonomy."""
     texts = taxo_texts()
+    # the ranking loop only ever tests membership — snapshot the keys once
+    taxo_tag_set = frozenset(texts)
     reported = tags_list(CIK)
 
     # Check if the target label exists in the taxonomy texts
-    if target_label not in texts:
+    if target_label not in taxo_tag_set:
         print(f"Error: '{target_label}' not found in taxonomy texts.")
         return None
 
@@ -150,25 +411,29 @@ def choose_revenue_substitute_by_descendants(CIK, target_label, top_n=5) -> Opti
         print(f"Error: Network containing '{target_label}' not found.")
         return None
 
-    # Get descendants of the target tag (all tags in the subtree of 'Revenue')
-    descendants = get_descendants(target_label, forest)  # 'forest' is your pre-built taxonomy tree
-
-    # Create a list to store tags and their structural distances from the target
-    distances = []
-
-    # Calculate the LCA-based distance for each descendant tag
-    for tag in descendants:
-        if tag in texts:  # Check if the tag exists in the taxonomy
-            distance = calculate_distance(target_label, tag, forest)
-            distances.append((tag, distance))
-
-    # Sort by distance (closer tags have smaller distance)
-    sorted_tags = sorted(distances, key=lambda x: x[1])
+    # Get descendants of the target tag (all tags in the subtree of 'Revenue').
+    # The flat children map is keyed by local tag name — passing the nested
+    # forest here used to return nothing and silently empty the ranking.
+    descendants = get_descendants(target_label, children_by_tag)
+
+    # One vectorized distance computation for every candidate, then a
+    # C-level partial selection — no per-pair Python calls, no full sort
+    candidates = [tag for tag in descendants if tag in taxo_tag_set]
+    dists = _distances_to(target_label, candidates)
+
+    n = min(top_n, dists.size)
+    sorted_tags = []
+    if n:
+        part = np.argpartition(dists, n - 1)[:n]
+        order = part[np.argsort(dists[part])]
+        sorted_tags = [(candidates[i],
+                        int(dists[i]) if np.isfinite(dists[i]) else float('inf'))
+                       for i in order]
 
     # Output top N structurally similar tags based on LCA distance
     print("\nTop structurally similar tags (based on descendants) — LCA distance")
     print("──────────────────────────────────────────────────────────────────")
-    for i, (tag, dist) in enumerate(sorted_tags[:top_n], 1):
+    for i, (tag, dist) in enumerate(sorted_tags, 1):
         print(f"{i:>2}. {tag:<60}  distance = {dist}")
     print("──────────────────────────────────────────────────────────────────")
 
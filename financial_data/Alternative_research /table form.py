@@ -1,5 +1,9 @@
-import os, time, json, requests
+import functools
+import os, time, json, threading, requests
+import ijson
+import orjson
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List, Optional, Tuple
 from cosine_similarity_selection import choose_revenue_substitute  # will be called ONLY on-demand
 
@@ -8,6 +12,13 @@ HEADERS = {"User-Agent": "FinancialDataCollector/1.0 (eng.sultan.fadi@gmail.com)
 SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
 OUT_CSV = "edgar_metrics.csv"
 
+# One keep-alive session shared by all fetch workers — the TLS handshake is
+# paid once, not per concept call; pool size matches the worker count.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=16, pool_maxsize=32))
+
 # keep small while testing
 TICKERS = ["NVDA"]
 METRICS = [
@@ -37,26 +48,60 @@ METRIC_PERIOD_TYPE = {
 }
 
 # ───────────────────── HELPERS ─────────────────────
+@functools.lru_cache(maxsize=1)
 def load_cik_map(cache="company_tickers.json") -> Dict[str, str]:
+    # memoized: the ~10k-ticker map is parsed once per process, not per call
     if not os.path.exists(cache):
-        r = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        r = SESSION.get(SEC_TICKER_URL, timeout=30)
         r.raise_for_status()
-        open(cache, "w").write(r.text)
-    data = json.load(open(cache))
-    return {d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()}
+        # atomic write of the raw bytes: no half-written cache on
+        # interruption, and no UTF-8 decode/encode round-trip via r.text
+        tmp = cache + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(r.content)
+        os.replace(tmp, cache)
+    data = orjson.loads(open(cache, "rb").read())
+    return {d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()}
+
+# Concept fetches are independent and I/O-bound; fan them out over a small
+# thread pool, cache each response per (cik, tag), and cap concurrent requests
+# with a semaphore so we respect SEC's ~10 req/s limit.
+MAX_WORKERS = 8
+_CONCEPT_CACHE: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+_CACHE_LOCK = threading.Lock()
+_SUB_CACHE_LOCK = threading.Lock()   # guards the (cik, metric) -> alt tags cache
+_SEC_SEM = threading.Semaphore(10)
+
+# Disk layer under the in-memory cache: reruns within the TTL never hit SEC.
+# 24h is enough — the underlying filings change at most quarterly.
+DISK_CACHE_DIR = ".sec_cache"
+DISK_CACHE_TTL = 24 * 3600
+os.makedirs(DISK_CACHE_DIR, exist_ok=True)
+
+def _disk_path(cik: str, tag: str) -> str:
+    return os.path.join(DISK_CACHE_DIR, f"{cik}_{tag}.json")
 
 def fetch_concept_rows(cik: str, tag: str, retries=3, pause=0.25) -> List[Dict[str, Any]]:
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
     for a in range(retries):
         try:
-            r = requests.get(url, headers=HEADERS, timeout=30)
+            with _SEC_SEM:
+                r = SESSION.get(url, timeout=30, stream=True)
             if r.status_code == 200:
-                js = r.json()
+                r.raw.decode_content = True
                 out=[]
-                for uom, rows in (js.get("units") or {}).items():
+                # Stream-parse the units: rows that can never pass the
+                # since-2014 10-K/10-Q filter are dropped before the full
+                # multi-megabyte response is ever materialized in memory.
+                for uom, rows in ijson.kvitems(r.raw, "units"):
                     for row in rows or []:
-                        row2 = dict(row); row2["uom"]=uom
-                        out.append(row2)
+                        if row.get("form") not in ("10-K", "10-Q"):
+                            continue
+                        fy = row.get("fy")
+                        if not (fy and str(fy).isdigit() and int(fy) >= 2014):
+                            continue
+                        row["uom"] = uom
+                        out.append(row)
                 return out
             if r.status_code in (429,500,502,503,504):
                 time.sleep(pause*(a+1)); continue
@@ -65,48 +110,61 @@ def fetch_concept_rows(cik: str, tag: str, retries=3, pause=0.25) -> List[Dict[s
             time.sleep(pause*(a+1))
     return []
 
-def unit_ok(metric: str, uom: Optional[str]) -> bool:
-    want = PREFERRED_UNITS.get(metric) or DEFAULT_UNIT
-    return uom == want
-
-def period_type(metric: str) -> Optional[str]:
-    return METRIC_PERIOD_TYPE.get(metric)
-
-def valid_since_2014(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out=[]
-    for r in rows:
-        fy = r.get("fy")
-        if fy and str(fy).isdigit() and int(fy) >= 2014 and r.get("form") in ("10-K","10-Q"):
-            out.append(r)
-    return out
-
-def filter_metric_rows(metric: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    pt_expected = period_type(metric)
-    out=[]
-    for r in rows:
-        pt = "duration" if r.get("start") else "instant"
-        if pt_expected and pt != pt_expected:
-            continue
-        if not unit_ok(metric, r.get("uom")):
-            continue
-        out.append(r)
-    return out
+def get_rows(cik: str, tag: str) -> List[Dict[str, Any]]:
+    """Cached concept lookup — memory first, then disk, then one SEC fetch."""
+    key = (cik, tag)
+    with _CACHE_LOCK:
+        if key in _CONCEPT_CACHE:
+            return _CONCEPT_CACHE[key]
 
-def pick_latest_filed_per_fy_form(rows: List[Dict[str, Any]]) -> Dict[Tuple[int, str], Dict[str, Any]]:
+    fp = _disk_path(cik, tag)
+    rows = None
+    if os.path.exists(fp) and time.time() - os.path.getmtime(fp) < DISK_CACHE_TTL:
+        try:
+            with open(fp) as fh:
+                rows = json.load(fh)
+        except (OSError, ValueError):
+            rows = None  # corrupt/partial cache file — refetch
+
+    if rows is None:
+        rows = fetch_concept_rows(cik, tag)
+        tmp = fp + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(rows, fh)
+        os.replace(tmp, fp)
+
+    with _CACHE_LOCK:
+        _CONCEPT_CACHE[key] = rows
+    return rows
+
+def prefetch_concepts(pairs: List[Tuple[str, str]]) -> None:
+    """Warm _CONCEPT_CACHE for all (cik, tag) pairs with parallel fetches."""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        list(pool.map(lambda p: get_rows(*p), pairs))
+
+def pick_best(metric: str, rows: List[Dict[str, Any]]) -> Dict[Tuple[int, str], Dict[str, Any]]:
     """
-    Keep the latest-filed row for each (FY, FORM). FORM ∈ {"10-K","10-Q"}.
+    Latest-filed fact per (FY, FORM), vectorized: one boolean mask for the
+    unit/period-type checks (form and since-2014 FY are already enforced at
+    stream time in fetch_concept_rows) and one sort + drop_duplicates for
+    the latest-filed reduction — no per-row Python loop.
     """
-    best: Dict[Tuple[int,str], Dict[str,Any]] = {}
-    for r in rows:
-        fy = r.get("fy")
-        form = r.get("form")
-        if not isinstance(fy, int) or form not in ("10-K","10-Q"):
-            continue
-        key = (fy, form)
-        prev = best.get(key)
-        if prev is None or (r.get("filed") or "") > (prev.get("filed") or ""):
-            best[key] = r
-    return best
+    if not rows:
+        return {}
+    df = pd.DataFrame(rows)
+    if "start" not in df.columns:  # instant-only tags carry no start column
+        df["start"] = None
+
+    pt_expected = METRIC_PERIOD_TYPE.get(metric)
+    want = PREFERRED_UNITS.get(metric) or DEFAULT_UNIT
+    mask = df["uom"] == want
+    if pt_expected:
+        mask &= df["start"].notna() == (pt_expected == "duration")
+
+    best = (df[mask]
+            .sort_values("filed")
+            .drop_duplicates(["fy", "form"], keep="last"))
+    return {(int(r["fy"]), r["form"]): r for r in best.to_dict("records")}
 
 def to_fact(tag: str, r: Dict[str, Any]) -> Dict[str, Any]:
     return {
@@ -124,132 +182,166 @@ def to_fact(tag: str, r: Dict[str, Any]) -> Dict[str, Any]:
 
 # ───────────────────── CORE LOGIC ─────────────────────
 def get_primary_best(cik: str, metric: str) -> Dict[Tuple[int,str], Dict[str,Any]]:
-    rows = fetch_concept_rows(cik, metric)
-    rows = valid_since_2014(rows)
-    rows = filter_metric_rows(metric, rows)
-    return {k: to_fact(metric, v) for k, v in pick_latest_filed_per_fy_form(rows).items()}
+    return {k: to_fact(metric, v)
+            for k, v in pick_best(metric, get_rows(cik, metric)).items()}
 
-def get_first_available_alternative(
+def _alt_rows_for(
     cik: str,
     metric: str,
-    missing_keys: List[Tuple[int,str]],
     substitute_cache: Dict[Tuple[str,str], List[str]],
-) -> Dict[Tuple[int,str], Dict[str,Any]]:
+) -> Tuple[List[str], Dict[str, Dict[Tuple[int,str], Dict[str,Any]]]]:
     """
-    Call choose_revenue_substitute ONLY IF we actually have missing (FY,FORM) pairs.
-    Returns a dict of filled facts for those keys where an alternative produced a non-null value.
+    Resolve this metric's alternative tags (chooser called once per CIK+metric)
+    and fetch+filter each alt tag's rows exactly once, in chooser-ranked order.
     """
-    filled: Dict[Tuple[int,str], Dict[str,Any]] = {}
-    if not missing_keys:
-        return filled
-
     cache_key = (cik, metric)
-    if cache_key not in substitute_cache:
+    with _SUB_CACHE_LOCK:
+        alt_tags = substitute_cache.get(cache_key)
+    if alt_tags is None:
         # ← THIS is where we call it — only now, because primary was missing
         alts = choose_revenue_substitute(cik, metric, top_n=24) or []
-        # store once per (CIK, metric)
-        substitute_cache[cache_key] = [a for a in alts if a and a != metric]
-    alt_tags = substitute_cache.get(cache_key, [])
-
+        # store once per (CIK, metric); setdefault keeps the first writer's
+        # list if two ticker threads raced on the same (cik, metric)
+        with _SUB_CACHE_LOCK:
+            alt_tags = substitute_cache.setdefault(
+                cache_key, [a for a in alts if a and a != metric])
     if not alt_tags:
-        return filled
+        return alt_tags, {}
 
-    # Try alternatives in order; accept first non-null for each missing (fy, form)
-    # We fetch each alt tag once, then reuse rows for all (fy, form)
+    # We fetch each alt tag once (in parallel), then reuse rows for all (fy, form)
+    prefetch_concepts([(cik, t) for t in alt_tags])
     alt_rows_by_tag: Dict[str, Dict[Tuple[int,str], Dict[str,Any]]] = {}
     for alt_tag in alt_tags:
-        rows = fetch_concept_rows(cik, alt_tag)
+        rows = get_rows(cik, alt_tag)
         if not rows:
             continue
-        rows = valid_since_2014(rows)
-        rows = filter_metric_rows(metric, rows)  # enforce original metric's unit + period-type
-        best = {k: to_fact(alt_tag, v) for k, v in pick_latest_filed_per_fy_form(rows).items()}
+        # enforce original metric's unit + period-type
+        best = {k: to_fact(alt_tag, v) for k, v in pick_best(metric, rows).items()}
         alt_rows_by_tag[alt_tag] = best
-        time.sleep(0.03)
+    return alt_tags, alt_rows_by_tag
 
+def _fill_first_available(
+    alt_tags: List[str],
+    alt_rows_by_tag: Dict[str, Dict[Tuple[int,str], Dict[str,Any]]],
+    missing_keys: List[Tuple[int,str]],
+) -> Dict[Tuple[int,str], Dict[str,Any]]:
+    """Accept the first non-null alternative (in ranked order) for each key."""
+    filled: Dict[Tuple[int,str], Dict[str,Any]] = {}
     for key in missing_keys:
-        fy, form = key
-        chosen = None
         for alt_tag in alt_tags:
             fact = alt_rows_by_tag.get(alt_tag, {}).get(key)
             if fact is not None and fact.get("value") is not None:
                 chosen = dict(fact)  # copy
                 chosen["source"] = "alternative"
+                filled[key] = chosen
                 break
-        if chosen:
-            filled[key] = chosen
     return filled
 
-def collect_to_csv(tickers: List[str], metrics: List[str], out_csv: str):
-    ticker2cik = load_cik_map()
-    rows_out = []
-    substitute_cache: Dict[Tuple[str,str], List[str]] = {}  # (cik, metric) -> [alt tags]
+def get_first_available_alternative(
+    cik: str,
+    metric: str,
+    missing_keys: List[Tuple[int,str]],
+    substitute_cache: Dict[Tuple[str,str], List[str]],
+) -> Dict[Tuple[int,str], Dict[str,Any]]:
+    """
+    Call choose_revenue_substitute ONLY IF we actually have missing (FY,FORM) pairs.
+    Returns a dict of filled facts for those keys where an alternative produced a non-null value.
+    """
+    if not missing_keys:
+        return {}
+    alt_tags, alt_rows_by_tag = _alt_rows_for(cik, metric, substitute_cache)
+    return _fill_first_available(alt_tags, alt_rows_by_tag, missing_keys)
 
-    for tkr in tickers:
-        cik = ticker2cik.get(tkr.upper())
-        if not cik:
-            print(f"CIK not found for {tkr}")
-            continue
+# Shared read-only sentinel for missing facts — never mutated
+_EMPTY_FACT: Dict[str, Any] = {}
+
+def _collect_ticker_rows(
+    tkr: str,
+    cik: Optional[str],
+    metrics: List[str],
+    substitute_cache: Dict[Tuple[str,str], List[str]],
+) -> List[Dict[str,Any]]:
+    """All output rows for one ticker — runs in its own worker thread."""
+    rows_out: List[Dict[str,Any]] = []
+    if not cik:
+        print(f"CIK not found for {tkr}")
+        return rows_out
+
+    # Warm the cache for every primary metric of this ticker in parallel
+    prefetch_concepts([(cik, m) for m in metrics])
+
+    for metric in metrics:
+        # 1) Primary facts (latest per FY+FORM)
+        prim = get_primary_best(cik, metric)
+
+        # Determine which (FY,FORM) slots exist across data for this metric
+        # We use the union of keys we see in primary; but also allow alternatives
+        # to introduce new FYs — so build the universe by peeking at primary; then
+        # we’ll fill only where primary is missing/None.
+        # First, list of candidate keys is just what primary already has:
+        keys = set(prim.keys())
 
-        for metric in metrics:
-            # 1) Primary facts (latest per FY+FORM)
-            prim = get_primary_best(cik, metric)
-
-            # Determine which (FY,FORM) slots exist across data for this metric
-            # We use the union of keys we see in primary; but also allow alternatives
-            # to introduce new FYs — so build the universe by peeking at primary; then
-            # we’ll fill only where primary is missing/None.
-            # First, list of candidate keys is just what primary already has:
-            keys = set(prim.keys())
-
-            # Identify missing or null primary values
-            missing_keys = [k for k in keys if (k not in prim) or (prim.get(k, {}).get("value") is None)]
-
-            # If we have NO primary at all for this metric, we still need some FY/FORM keys to try.
-            # In that case, try to discover keys from the first alternative tag after we call the chooser.
-            if not keys:
-                # call chooser once – only because everything is missing
-                alt_filled_probe = get_first_available_alternative(cik, metric, [(9999,"10-K")], substitute_cache)  # dummy key to force cache fill
-                # Now that cache is filled, probe actual alt tags to collect keys universe
-                keys = set()
-                for alt_tag in substitute_cache.get((cik, metric), []):
-                    rows = fetch_concept_rows(cik, alt_tag)
-                    rows = valid_since_2014(rows)
-                    rows = filter_metric_rows(metric, rows)
-                    best = pick_latest_filed_per_fy_form(rows)
-                    keys.update(best.keys())
-                    time.sleep(0.03)
-                missing_keys = list(keys)  # all are missing
+        # Identify missing or null primary values
+        missing_keys = [k for k in keys if (k not in prim) or (prim.get(k, {}).get("value") is None)]
 
+        # If we have NO primary at all for this metric, we still need some FY/FORM keys to try.
+        # In that case, try to discover keys from the first alternative tag after we call the chooser.
+        if not keys:
+            # everything is missing — resolve the alt tags once and take
+            # the key universe straight from the rows just fetched, instead
+            # of a dummy-key probe followed by a second pass over the tags
+            alt_tags, alt_rows_by_tag = _alt_rows_for(cik, metric, substitute_cache)
+            keys = set().union(*(d.keys() for d in alt_rows_by_tag.values())) \
+                   if alt_rows_by_tag else set()
+            alt = _fill_first_available(alt_tags, alt_rows_by_tag, sorted(keys))
+        else:
             # 2) Fill missing ONLY IF needed (this is the only place we ever call the chooser)
             alt = get_first_available_alternative(cik, metric, missing_keys, substitute_cache)
 
-            # 3) Emit rows for both 10-K and 10-Q (whatever exists among keys)
-            for (fy, form) in sorted(keys):
-                fact = prim.get((fy, form))
-                source = "primary"
-                tag_used = metric
-                if fact is None or fact.get("value") is None:
-                    fact = alt.get((fy, form))
-                    source = (fact or {}).get("source") or "missing"
-                    tag_used = (fact or {}).get("tag") or metric
-
-                rows_out.append({
-                    "ticker": tkr,
-                    "cik": cik,
-                    "fy": fy,
-                    "form": form,                 # "10-K" or "10-Q"
-                    "metric": metric,             # requested metric
-                    "tag_used": tag_used,         # actual tag used (metric or alternative)
-                    "value": (fact or {}).get("value"),
-                    "unit": (fact or {}).get("unit"),
-                    "filed": (fact or {}).get("filed"),
-                    "fp": (fact or {}).get("fp"),
-                    "start": (fact or {}).get("start"),
-                    "end": (fact or {}).get("end"),
-                    "source": source,             # "primary" / "alternative" / "missing"
-                })
-            time.sleep(0.05)
+        # 3) Emit rows for both 10-K and 10-Q (whatever exists among keys)
+        for (fy, form) in sorted(keys):
+            fact = prim.get((fy, form))
+            source = "primary"
+            tag_used = metric
+            if fact is None or fact.get("value") is None:
+                # fall back to the shared empty sentinel — no throwaway
+                # {} allocation per missing field lookup below
+                fact = alt.get((fy, form)) or _EMPTY_FACT
+                source = fact.get("source") or "missing"
+                tag_used = fact.get("tag") or metric
+
+            rows_out.append({
+                "ticker": tkr,
+                "cik": cik,
+                "fy": fy,
+                "form": form,                 # "10-K" or "10-Q"
+                "metric": metric,             # requested metric
+                "tag_used": tag_used,         # actual tag used (metric or alternative)
+                "value": fact.get("value"),
+                "unit": fact.get("unit"),
+                "filed": fact.get("filed"),
+                "fp": fact.get("fp"),
+                "start": fact.get("start"),
+                "end": fact.get("end"),
+                "source": source,             # "primary" / "alternative" / "missing"
+            })
+    return rows_out
+
+def collect_to_csv(tickers: List[str], metrics: List[str], out_csv: str):
+    ticker2cik = load_cik_map()
+    rows_out: List[Dict[str,Any]] = []
+    substitute_cache: Dict[Tuple[str,str], List[str]] = {}  # (cik, metric) -> [alt tags]
+
+    # Tickers are independent, I/O-bound units of work — fan them out across
+    # a thread pool. SEC pacing stays with _SEC_SEM, which all worker
+    # threads share, so total request rate never exceeds the budget.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {ex.submit(_collect_ticker_rows, tkr,
+                             ticker2cik.get(tkr.upper()), metrics,
+                             substitute_cache): tkr
+                   for tkr in tickers}
+        for fut in as_completed(futures):
+            rows_out.extend(fut.result())
 
     # 4) Save CSV (tidy table)
     df = pd.DataFrame(rows_out).sort_values(["ticker","fy","form","metric"])
@@ -1,18 +1,21 @@
+import functools
 from pathlib import Path
 from typing import  List
-import json
-from helper import _dl
+import orjson
+from helper import _dl, disk_cache
 #CIK          = "0000320193"          # Apple Inc.
 YEAR_CUTOFF  = 2014
 TRY_YEARS    = ("2024", "2023")      # first one found will be used
 
 CACHE_DIR    = Path("../.cache"); CACHE_DIR.mkdir(exist_ok=True)
 # ───────── FETCH APPLE’S REPORTED TAGS —————————————————————————
+@functools.lru_cache(maxsize=128)  # per-CIK in-memory hit across metrics
+@disk_cache("tags_list")
 def tags_list(CIK) -> List[str]:
     """Return GAAP tags Apple reported in YEAR_CUTOFF..present (excluding 'Revenues')."""
     FACTS_URL = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{CIK}.json"
     fp = CACHE_DIR / "aapl_facts.json"; _dl(FACTS_URL, fp)
-    facts = json.loads(fp.read_bytes())
+    facts = orjson.loads(fp.read_bytes())  # 3-5x faster on multi-MB companyfacts
     tags = set()
     for tag, node in facts["facts"]["us-gaap"].items():
         if tag == "Revenues":
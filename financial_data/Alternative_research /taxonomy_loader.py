@@ -1,7 +1,9 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import requests
 import lxml.etree as ET
-from helper import _dl
+from helper import _dl, disk_cache
 
 HEADERS      = {"User-Agent": "eng.sultan.fadi@gmail.com (semantic-revenue-finder)"}
 YEAR_CUTOFF  = 2014
@@ -10,6 +12,30 @@ CACHE_DIR    = Path("../.cache"); CACHE_DIR.mkdir(exist_ok=True)
 
 # ───────── LOAD TAXONOMY LABEL+DEFINITION TEXTS ——————————————
 
+_LABEL_TAG   = "{http://www.xbrl.org/2003/linkbase}label"
+_XLINK_ROLE  = "{http://www.w3.org/1999/xlink}role"
+_XLINK_LABEL = "{http://www.w3.org/1999/xlink}label"
+
+
+def _collect_labels(fp, role_suffix: str, texts: dict) -> None:
+    """Stream <link:label> elements from a linkbase file into `texts`.
+
+    iterparse never builds the full DOM: each element is cleared (and its
+    already-seen siblings dropped) as soon as it has been read, so memory
+    stays flat even for tens-of-MB taxonomy files.
+    """
+    for _, lb in ET.iterparse(str(fp), tag=_LABEL_TAG):
+        if lb.get(_XLINK_ROLE, "").endswith(role_suffix):
+            tag = lb.get(_XLINK_LABEL, "").split("_", 1)[-1]
+            if tag:
+                texts.setdefault(tag, []).append(lb.text or "")
+        lb.clear()
+        while lb.getprevious() is not None:
+            del lb.getparent()[0]
+
+
+@functools.lru_cache(maxsize=1)   # in-memory hit for repeated calls in one run
+@disk_cache(f"taxo_texts_{'-'.join(TRY_YEARS)}")
 def taxo_texts() -> dict:
     """
     Return {tag: "<label + definition>"} for a usable taxonomy year in TRY_YEARS.
@@ -19,27 +45,16 @@ def taxo_texts() -> dict:
         lab_fp = CACHE_DIR / f"lab_{yr}.xml"
         doc_fp = CACHE_DIR / f"doc_{yr}.xml"
         try:
-            _dl(f"{base}/us-gaap-lab-{yr}.xml", lab_fp)
-            _dl(f"{base}/us-gaap-doc-{yr}.xml", doc_fp)
+            # both linkbases in flight at once instead of back-to-back
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                futs = [pool.submit(_dl, f"{base}/us-gaap-lab-{yr}.xml", lab_fp),
+                        pool.submit(_dl, f"{base}/us-gaap-doc-{yr}.xml", doc_fp)]
+                for fut in futs:
+                    fut.result()
 
-            ns = {"link": "http://www.xbrl.org/2003/linkbase"}
             texts = {}
-
-            # Standard labels
-            for lb in ET.parse(lab_fp).iterfind(".//link:label", ns):
-                role = lb.get("{http://www.w3.org/1999/xlink}role", "")
-                if role.endswith("/label"):
-                    tag = lb.get("{http://www.w3.org/1999/xlink}label", "").split("_", 1)[-1]
-                    if tag:
-                        texts.setdefault(tag, []).append(lb.text or "")
-
-            # Documentation labels (definitions)
-            for lb in ET.parse(doc_fp).iterfind(".//link:label", ns):
-                role = lb.get("{http://www.w3.org/1999/xlink}role", "")
-                if role.endswith("/documentation"):
-                    tag = lb.get("{http://www.w3.org/1999/xlink}label", "").split("_", 1)[-1]
-                    if tag:
-                        texts.setdefault(tag, []).append(lb.text or "")
+            _collect_labels(lab_fp, "/label", texts)          # standard labels
+            _collect_labels(doc_fp, "/documentation", texts)  # definitions
 
             return {k: " ".join(v) for k, v in texts.items()}
 
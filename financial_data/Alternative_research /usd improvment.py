@@ -1,8 +1,12 @@
 import requests
 import json
+import orjson
+import multiprocessing as mp
 import os
 import time
 from collections import defaultdict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ─────────────────── CONFIG ───────────────────
 HEADERS = {"User-Agent": "eng.sultan.fadi@gmail.com"}
@@ -10,6 +14,15 @@ SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
 DATA_DIR = "financial_data_2"
 os.makedirs(DATA_DIR, exist_ok=True)
 
+# Keep-alive session — created at import time, so every worker process gets
+# its own pooled connections instead of a fresh TCP+TLS handshake per tag
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 502, 503, 504])))
+
 TICKERS = [
     "AAPL", "MSFT", "GOOGL", "AMZN", "META",
     "TSLA", "NVDA", "JPM", "V", "UNH",
@@ -82,20 +95,21 @@ METRIC_ALIASES = {
 def load_cik_map(cache="company_tickers.json"):
     if not os.path.exists(cache):
         print("Downloading ticker→CIK map …")
-        res = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        res = SESSION.get(SEC_TICKER_URL, timeout=30)
         res.raise_for_status()
         with open(cache, "w") as fp:
             fp.write(res.text)
-    with open(cache, "r") as fp:
-        data = json.load(fp)
+    # orjson parses the ~2 MB tickers file several times faster than stdlib
+    with open(cache, "rb") as fp:
+        data = orjson.loads(fp.read())
     return {
-        d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()
+        d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()
     }
 
 
 def fetch_concept(cik: str, tag: str):
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
-    r = requests.get(url, headers=HEADERS, timeout=30)
+    r = SESSION.get(url, timeout=30)
     if r.status_code != 200:
         return []
     units = r.json().get("units", {})
@@ -111,17 +125,15 @@ def entries_since_2014(entries):
 
 # ───────────── MAIN PROCESS ─────────────
 
-ticker2cik = load_cik_map()
-missing = defaultdict(list)
-
-for tkr in TICKERS:
-    cik = ticker2cik.get(tkr)
-    if not cik:
-        print(f"CIK not found for {tkr}")
-        continue
+def process_ticker(tkr, cik):
+    """Fetch every metric for one ticker, derive FCF, write its JSON file.
 
+    Runs inside a worker process, so it only returns the list of missing
+    metrics — each worker keeps its own requests connections.
+    """
     print(f"\n▶ {tkr} (CIK {cik})")
     data = {"ticker": tkr, "cik": cik, "financials": {}}
+    miss = []
 
     for main, alts in METRIC_ALIASES.items():
         found = False
@@ -135,7 +147,7 @@ for tkr in TICKERS:
                 break
             time.sleep(0.25)
         if not found and main != "FreeCashFlow":
-            missing[tkr].append(main)
+            miss.append(main)
 
     # derive FreeCashFlow
     for p, vals in data["financials"].items():
@@ -144,18 +156,47 @@ for tkr in TICKERS:
         if op is not None and capex is not None:
             vals["FreeCashFlow"] = op - capex
         else:
-            missing[tkr].append("FreeCashFlow")
+            miss.append("FreeCashFlow")
 
     with open(os.path.join(DATA_DIR, f"{tkr}.json"), "w") as fp:
         json.dump(data, fp, indent=2)
 
-# ───────────── REPORT ─────────────
-print("\n===== Missing‑Tag Report =====")
-for tkr in TICKERS:
-    miss = sorted(set(missing.get(tkr, [])))
-    if miss:
-        print(f"{tkr}: {', '.join(miss)}")
-    else:
-        print(f"{tkr}: All metrics present")
+    return tkr, miss
+
+
+def main():
+    ticker2cik = load_cik_map()
+    missing = defaultdict(list)
+
+    # One worker per core: the FY-row build and JSON dump are CPU-bound, so
+    # threads would just fight over the GIL
+    pool_list = []
+    pool = mp.Pool(os.cpu_count())
+    for tkr in TICKERS:
+        cik = ticker2cik.get(tkr)
+        if not cik:
+            print(f"CIK not found for {tkr}")
+            continue
+        pool_list.append(
+            pool.apply_async(process_ticker, (tkr, cik), error_callback=print))
+    pool.close()
+    pool.join()
+
+    for res in pool_list:
+        tkr, miss = res.get()
+        missing[tkr] = miss
+
+    # ───────────── REPORT ─────────────
+    print("\n===== Missing‑Tag Report =====")
+    for tkr in TICKERS:
+        miss = sorted(set(missing.get(tkr, [])))
+        if miss:
+            print(f"{tkr}: {', '.join(miss)}")
+        else:
+            print(f"{tkr}: All metrics present")
+
+    print("\n✅ Completed. JSON files saved in ./financial_data")
+
 
-print("\n✅ Completed. JSON files saved in ./financial_data")
+if __name__ == "__main__":
+    main()
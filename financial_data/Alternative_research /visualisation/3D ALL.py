@@ -1,9 +1,13 @@
 # pip install plotly pandas
 
-import json
+import heapq
+import ijson
+import operator
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -36,55 +40,41 @@ def find_json_files(dirs, recursive=False):
         files.extend(sorted((d.rglob("*.json") if recursive else d.glob("*.json"))))
     return [p for p in files if p.is_file()]
 
-def infer_ticker(json_obj, path: Path):
-    if isinstance(json_obj, dict):
-        t = json_obj.get("ticker") or json_obj.get("symbol") or json_obj.get("companyTicker")
-        if t:
-            return str(t).upper()
-    return path.stem.upper()
-
-def choose_fy_kind(payload):
+def choose_fy_kind(payload, _dict=dict, _int=int):
     """
     Return ('primary'|'alternative', year) if FY is present; else None.
     Prefers primary; else first FY alternative.
+
+    Hot path — called once per (file, metric): dict/int are bound as locals
+    and every branch bails out as early as possible.
     """
-    if not isinstance(payload, dict):
+    if type(payload) is not _dict:
         return None
     primary = payload.get("primary")
-    alts    = payload.get("alternatives", [])
-    if isinstance(primary, dict) and primary.get("fp") == "FY" and primary.get("fy") is not None:
-        return "primary", int(primary["fy"])
-    for a in alts:
-        if isinstance(a, dict) and a.get("fp") == "FY" and a.get("fy") is not None:
-            return "alternative", int(a["fy"])
+    if (type(primary) is _dict and primary.get("fp") == "FY"
+            and primary.get("fy") is not None):
+        return "primary", _int(primary["fy"])
+    for a in payload.get("alternatives", ()):
+        if (type(a) is _dict and a.get("fp") == "FY"
+                and a.get("fy") is not None):
+            return "alternative", _int(a["fy"])
     return None
 
-def build_cuboid(xc, yc, z, dx=0.38, dy=0.38):
-    """
-    Build vertices & i,j,k faces for a cuboid bar centered at (xc,yc), height=z (from 0..z).
-    dx,dy are half-widths along x,y. Returns dict for Mesh3d.
-    Vertex order: bottom 0..3, top 4..7.
-    """
-    x0, x1 = xc - dx, xc + dx
-    y0, y1 = yc - dy, yc + dy
-    z0, z1 = 0.0, float(z)
-
-    # 8 vertices
-    xs = [x0, x1, x1, x0, x0, x1, x1, x0]
-    ys = [y0, y0, y1, y1, y0, y0, y1, y1]
-    zs = [z0, z0, z0, z0, z1, z1, z1, z1]
-
-    # 12 triangular faces (2 per face × 6 faces)
-    faces = [
-        (0,1,2), (0,2,3),   # bottom
-        (4,5,6), (4,6,7),   # top
-        (0,1,5), (0,5,4),   # side x+
-        (1,2,6), (1,6,5),   # side y+
-        (2,3,7), (2,7,6),   # side x-
-        (3,0,4), (3,4,7),   # side y-
-    ]
-    i, j, k = zip(*faces)
-    return dict(x=xs, y=ys, z=zs, i=i, j=j, k=k)
+# Cuboid templates shared by every bar: unit-corner vertices (bottom 0..3,
+# top 4..7; x/y columns scaled by the half-widths, z by the bar height) and
+# the 12 triangular faces (2 per face × 6 faces).
+CUBOID_VERTS = np.array([
+    [-1, -1, 0], [+1, -1, 0], [+1, +1, 0], [-1, +1, 0],
+    [-1, -1, 1], [+1, -1, 1], [+1, +1, 1], [-1, +1, 1],
+], dtype=float)
+CUBOID_FACES = np.array([
+    (0,1,2), (0,2,3),   # bottom
+    (4,5,6), (4,6,7),   # top
+    (0,1,5), (0,5,4),   # side x+
+    (1,2,6), (1,6,5),   # side y+
+    (2,3,7), (2,7,6),   # side x-
+    (3,0,4), (3,4,7),   # side y-
+], dtype=np.int32)
 
 # =========================
 # Aggregate
@@ -93,59 +83,61 @@ files = find_json_files(DATA_DIRS, recursive=RECURSIVE)
 if not files:
     raise SystemExit("[WARN] No JSON files found in the configured directories.")
 
-# sets of companies per (tag, year)
-primary_sets     = defaultdict(set)  # (tag, year) -> set(ticker)
-alternative_sets = defaultdict(set)  # (tag, year) -> set(ticker)
-
-# per (company, year) counts (for primary share scatter)
-per_cy_primary = defaultdict(int)
-per_cy_alt     = defaultdict(int)
+# one flat record per (company, tag, year): aggregated later with a single
+# C-level groupby instead of N defaultdict-of-sets scatter writes
+records = []                         # (ticker, tag, year, kind)
 
 all_tickers = set()
 tag_popularity = Counter()
 all_years = set()
 
-for p in files:
+def parse_file(p):
+    """Read one company JSON and emit its (ticker, tag, year, kind) records.
+
+    Streams the file with ijson: one (period, metrics) pair lives in memory
+    at a time instead of the whole 'financials' dict. Runs in a worker
+    thread; returns plain tuples, so merging in the main thread needs no
+    locks.
+    """
+    # Deduplicate once per (company, tag, year)
+    seen_year_tag = set()
+    recs = []
+
     try:
-        with p.open("r") as f:
-            data = json.load(f)
+        with open(p, "rb") as f:
+            ticker = next(ijson.items(f, "ticker"), None)
+            ticker = str(ticker).upper() if ticker else p.stem.upper()
+            f.seek(0)
+            for _period, metrics in ijson.kvitems(f, "financials"):
+                if not isinstance(metrics, dict):
+                    continue
+                for tag, payload in metrics.items():
+                    res = choose_fy_kind(payload)
+                    if not res:
+                        continue
+                    kind, year = res
+                    key = (year, tag)
+                    if key in seen_year_tag:
+                        continue
+                    seen_year_tag.add(key)
+                    recs.append((ticker, tag, year, kind))
     except Exception as e:
         print(f"[ERROR] {p}: {e}")
-        continue
-
-    ticker = infer_ticker(data, p)
-    all_tickers.add(ticker)
+        return None
+    return ticker, recs
 
-    financials = data.get("financials")
-    if not isinstance(financials, dict):
-        print(f"[WARN] Missing/invalid 'financials' in {p}")
-        continue
 
-    # Deduplicate once per (company, tag, year)
-    seen_year_tag = set()
-
-    for _period, metrics in financials.items():
-        if not isinstance(metrics, dict):
+# files are independent — parse them across a thread pool and merge the
+# returned tuples in the main thread
+with ThreadPoolExecutor(max_workers=8) as ex:
+    for parsed in ex.map(parse_file, files):
+        if parsed is None:
             continue
-        for tag, payload in metrics.items():
-            res = choose_fy_kind(payload)
-            if not res:
-                continue
-            kind, year = res
-            key = (year, tag)
-            if key in seen_year_tag:
-                continue
-            seen_year_tag.add(key)
+        ticker, recs = parsed
+        all_tickers.add(ticker)
+        records.extend(recs)
+        for (_t, tag, year, _kind) in recs:
             all_years.add(year)
-
-            # sets for surfaces/bars
-            if kind == "primary":
-                primary_sets[(tag, year)].add(ticker)
-                per_cy_primary[(ticker, year)] += 1
-            else:
-                alternative_sets[(tag, year)].add(ticker)
-                per_cy_alt[(ticker, year)] += 1
-
             tag_popularity[tag] += 1
 
 n_companies_found = len(all_tickers)
@@ -159,7 +151,8 @@ years = sorted(all_years)
 
 # Choose top-N tags for surfaces/bars to keep it readable
 if TOP_N_TAGS is not None:
-    tags = [t for t, _ in tag_popularity.most_common(TOP_N_TAGS)]
+    tags = [t for t, _ in heapq.nlargest(TOP_N_TAGS, tag_popularity.items(),
+                                         key=operator.itemgetter(1))]
 else:
     tags = sorted(tag_popularity.keys())
 
@@ -169,30 +162,35 @@ if not tags:
 tag_to_idx = {t: i for i, t in enumerate(tags)}
 year_to_idx = {y: i for i, y in enumerate(years)}
 
-# Build Z matrices (years × tags) for surfaces
-Zp = np.zeros((len(years), len(tags)), dtype=int)
-Za = np.zeros((len(years), len(tags)), dtype=int)
-
-for (tag, year), comps in primary_sets.items():
-    if tag in tag_to_idx and year in year_to_idx:
-        Zp[year_to_idx[year], tag_to_idx[tag]] = len(comps)
-
-for (tag, year), comps in alternative_sets.items():
-    if tag in tag_to_idx and year in year_to_idx:
-        Za[year_to_idx[year], tag_to_idx[tag]] = len(comps)
-
-# Build company-year table for scatter
-rows = []
-for (ticker, year) in set(list(per_cy_primary.keys()) + list(per_cy_alt.keys())):
-    p = per_cy_primary.get((ticker, year), 0)
-    a = per_cy_alt.get((ticker, year), 0)
-    total = p + a
-    if total == 0:
-        continue
-    p_share = p / total
-    rows.append({"ticker": ticker, "year": year, "primary": p, "alt": a, "total": total, "p_share": p_share})
-
-df_cy = pd.DataFrame(rows)
+# Build Z matrices (years × tags) for surfaces — one vectorized groupby over
+# the flat records instead of a Python loop over (tag, year) cells
+rec_df = pd.DataFrame.from_records(records, columns=["ticker", "tag", "year", "kind"])
+counts = (rec_df.drop_duplicates()
+          .groupby(["kind", "year", "tag"])["ticker"].nunique())
+
+def grid_for(kind):
+    if kind not in counts.index.get_level_values("kind"):
+        return np.zeros((len(years), len(tags)), dtype=int)
+    return (counts.loc[kind].unstack(fill_value=0)
+            .reindex(index=years, columns=tags, fill_value=0)
+            .to_numpy())
+
+Zp = grid_for("primary")
+Za = grid_for("alternative")
+
+# Build company-year table for scatter — one pivot_table over the same flat
+# records instead of a Python loop appending a dict per (company, year)
+df_cy = (rec_df.drop_duplicates()
+         .pivot_table(index=["ticker", "year"], columns="kind", values="tag",
+                      aggfunc="count", fill_value=0)
+         .reset_index()
+         .rename(columns={"alternative": "alt"}))
+for col in ("primary", "alt"):       # a kind can be absent from the data
+    if col not in df_cy.columns:
+        df_cy[col] = 0
+df_cy["total"]   = df_cy["primary"] + df_cy["alt"]
+df_cy = df_cy[df_cy["total"] > 0]
+df_cy["p_share"] = df_cy["primary"] / df_cy["total"]
 if df_cy.empty:
     raise SystemExit("[INFO] No per-company/year records to plot for scatter.")
 
@@ -216,28 +214,32 @@ fig = make_subplots(
 # x: tag index, y: years (numeric), z: #companies
 X = np.arange(len(tags))
 Y = np.array(years)
-XX, YY = np.meshgrid(X, Y)
+
+# zero-copy (years × tags × 1) view of the tag names — np.broadcast_to only
+# adjusts strides, unlike the old dstack over a nested list comprehension
+tag_arr = np.asarray(tags, dtype=object)
+tag_customdata = np.broadcast_to(tag_arr[None, :, None], (len(years), len(tags), 1))
 
 fig.add_trace(
     go.Surface(
-        x=XX, y=YY, z=Zp,
+        x=X, y=Y, z=Zp,
         name="Primary Surface",
         showscale=True,
         colorbar=dict(title="# Companies", x=0.31),
         hovertemplate="Tag=%{customdata[0]}<br>Year=%{y}<br>Primary=%{z}<extra></extra>",
-        customdata=np.dstack([[tags[i] for i in X] for _ in Y])
+        customdata=tag_customdata
     ),
     row=1, col=1
 )
 
 fig.add_trace(
     go.Surface(
-        x=XX, y=YY, z=Za,
+        x=X, y=Y, z=Za,
         name="Alternative Surface",
         opacity=0.8,
         showscale=False,
         hovertemplate="Tag=%{customdata[0]}<br>Year=%{y}<br>Alternative=%{z}<extra></extra>",
-        customdata=np.dstack([[tags[i] for i in X] for _ in Y])
+        customdata=tag_customdata
     ),
     row=1, col=1
 )
@@ -258,23 +260,26 @@ offset = 0.22  # shift between primary and alternative along x
 
 # We'll build two Mesh3d traces (one for primary, one for alternative)
 def build_mesh_for_grid(Z, label, x_shift):
-    xs_all, ys_all, zs_all, i_all, j_all, k_all = [], [], [], [], [], []
-    vert_offset = 0
-    for yi, year in enumerate(years):
-        for xi, tag in enumerate(tags):
-            h = int(Z[yi, xi])
-            if h <= 0:
-                continue
-            cub = build_cuboid(xc=xi + x_shift, yc=year, z=h, dx=dx, dy=dy)
-            # append, shifting face indices
-            xs_all += cub["x"]; ys_all += cub["y"]; zs_all += cub["z"]
-            i_all += [v + vert_offset for v in cub["i"]]
-            j_all += [v + vert_offset for v in cub["j"]]
-            k_all += [v + vert_offset for v in cub["k"]]
-            vert_offset += 8  # 8 vertices per cuboid
+    # one broadcast over all non-zero cells: (N,8,3) vertices and (N,12,3)
+    # face indices, no per-bar Python work. float32 verts / int32 faces are
+    # plenty for plot coordinates and halve the serialized HTML payload.
+    yi, xi = np.nonzero(Z > 0)
+    n = yi.size
+    heights = Z[yi, xi].astype(np.float32)
+    years_arr = np.asarray(years, dtype=np.float32)
+
+    verts = np.empty((n, 8, 3), dtype=np.float32)
+    verts[:, :, 0] = (xi + x_shift)[:, None] + CUBOID_VERTS[:, 0] * dx
+    verts[:, :, 1] = years_arr[yi][:, None] + CUBOID_VERTS[:, 1] * dy
+    verts[:, :, 2] = CUBOID_VERTS[None, :, 2] * heights[:, None]
+
+    faces = (CUBOID_FACES[None, :, :]
+             + (np.arange(n, dtype=np.int32) * 8)[:, None, None])
+    # .ravel() on these slices yields C-contiguous buffers, so Plotly's
+    # encoder takes the typed-array fast path instead of per-item boxing
     return go.Mesh3d(
-        x=xs_all, y=ys_all, z=zs_all,
-        i=i_all, j=j_all, k=k_all,
+        x=verts[:, :, 0].ravel(), y=verts[:, :, 1].ravel(), z=verts[:, :, 2].ravel(),
+        i=faces[:, :, 0].ravel(), j=faces[:, :, 1].ravel(), k=faces[:, :, 2].ravel(),
         name=label,
         opacity=0.95,
         flatshading=True,
@@ -1,9 +1,13 @@
 # pip install plotly pandas
 
-import json
+import heapq
+import ijson
+import operator
 from pathlib import Path
 from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -33,23 +37,22 @@ def find_json_files(dirs, recursive=False):
         files.extend(sorted((d.rglob("*.json") if recursive else d.glob("*.json"))))
     return [p for p in files if p.is_file()]
 
-def infer_ticker(json_obj, path: Path):
-    t = None
-    if isinstance(json_obj, dict):
-        t = json_obj.get("ticker") or json_obj.get("symbol") or json_obj.get("companyTicker")
-    return (t or path.stem).upper()
+def choose_entry(payload, _dict=dict, _int=int):
+    """Return ('primary'|'alternative', year, metric) if FY is present; else None.
 
-def choose_entry(payload):
-    """Return ('primary'|'alternative', year, metric) if FY is present; else None."""
-    if not isinstance(payload, dict):
+    Hot path — called once per (file, metric): dict/int are bound as locals
+    and every branch bails out as early as possible.
+    """
+    if type(payload) is not _dict:
         return None
     primary = payload.get("primary")
-    alts    = payload.get("alternatives", [])
-    if isinstance(primary, dict) and primary.get("fp") == "FY" and primary.get("fy") is not None:
-        return "primary", int(primary["fy"])
-    alt = next((a for a in alts if isinstance(a, dict) and a.get("fp") == "FY" and a.get("fy") is not None), None)
-    if alt:
-        return "alternative", int(alt["fy"])
+    if (type(primary) is _dict and primary.get("fp") == "FY"
+            and primary.get("fy") is not None):
+        return "primary", _int(primary["fy"])
+    for a in payload.get("alternatives", ()):
+        if (type(a) is _dict and a.get("fp") == "FY"
+                and a.get("fy") is not None):
+            return "alternative", _int(a["fy"])
     return None
 
 # --------------------------------
@@ -60,51 +63,56 @@ if not files:
     raise SystemExit("[WARN] No JSON files found in the configured directories.")
 
 company_ids = set()
-# counts per (year, tag) -> #companies for primary/alternative
-primary_counts = defaultdict(set)     # (year, tag) -> set of company ids
-alternative_counts = defaultdict(set) # (year, tag) -> set of company ids
+# one flat record per (company, metric, year) — aggregated with a single
+# C-level groupby after the scan instead of defaultdict-of-sets writes
+records = []                          # (ticker, metric, year, kind)
 # for selecting top tags
 tag_total_counter = Counter()         # tag -> total occurrences (primary+alt across years & companies)
 
-for p in files:
+def parse_file(p):
+    """Read one company JSON and emit its (ticker, metric, year, kind) rows.
+
+    Streams the file with ijson: one (period, metrics) pair lives in memory
+    at a time instead of the whole 'financials' dict.
+    """
+    # Deduplicate per (year, metric) per company
+    seen_year_metric = set()
+    recs = []
+
     try:
-        with p.open("r") as f:
-            data = json.load(f)
+        with open(p, "rb") as f:
+            ticker = next(ijson.items(f, "ticker"), None)
+            ticker = str(ticker).upper() if ticker else p.stem.upper()
+            f.seek(0)
+            for _period, metrics in ijson.kvitems(f, "financials"):
+                if not isinstance(metrics, dict):
+                    continue
+                for metric, payload in metrics.items():
+                    chosen = choose_entry(payload)
+                    if not chosen:
+                        continue
+                    used, year = chosen
+                    key = (year, metric)
+                    if key in seen_year_metric:
+                        continue
+                    seen_year_metric.add(key)
+                    recs.append((ticker, metric, year, used))
     except Exception as e:
         print(f"[ERROR] {p}: {e}")
-        continue
-
-    ticker = infer_ticker(data, p)
-    company_ids.add(ticker)
+        return None
+    return ticker, recs
 
-    fin = data.get("financials")
-    if not isinstance(fin, dict):
-        print(f"[WARN] Missing/invalid 'financials' in {p}")
-        continue
 
-    # Deduplicate per (year, metric) per company
-    seen_year_metric = set()
-
-    for period, metrics in fin.items():
-        if not isinstance(metrics, dict):
+# parse the independent files across a thread pool; workers return tuples,
+# so the merge below is lock-free
+with ThreadPoolExecutor(max_workers=8) as ex:
+    for parsed in ex.map(parse_file, files):
+        if parsed is None:
             continue
-        for metric, payload in metrics.items():
-            chosen = choose_entry(payload)
-            if not chosen:
-                continue
-            used, year = chosen
-            key = (year, metric)
-            if key in seen_year_metric:
-                continue
-            seen_year_metric.add(key)
-
-            # record counts per (year, tag)
-            if used == "primary":
-                primary_counts[(year, metric)].add(ticker)
-            else:
-                alternative_counts[(year, metric)].add(ticker)
-
-            # for top-20 selection
+        ticker, recs = parsed
+        company_ids.add(ticker)
+        records.extend(recs)
+        for (_t, metric, _y, _k) in recs:
             tag_total_counter[metric] += 1
 
 # sanity on company count
@@ -113,12 +121,13 @@ if n_companies != EXPECTED_NCOS:
     print(f"[WARN] Companies found: {n_companies} (expected {EXPECTED_NCOS})")
 
 # years present
-years = sorted(set(y for (y, _t) in (set(primary_counts.keys()) | set(alternative_counts.keys()))))
+years = sorted({year for (_t, _m, year, _k) in records})
 if not years:
     raise SystemExit("[INFO] No FY entries found across files.")
 
 # pick top N tags
-top_tags = [t for t, _ in tag_total_counter.most_common(TOP_N_TAGS)]
+top_tags = [t for t, _ in heapq.nlargest(TOP_N_TAGS, tag_total_counter.items(),
+                                         key=operator.itemgetter(1))]
 if not top_tags:
     raise SystemExit("[INFO] No tags found to plot.")
 
@@ -127,15 +136,20 @@ if not top_tags:
 tag_to_idx = {t: i for i, t in enumerate(top_tags)}
 year_to_idx = {y: i for i, y in enumerate(years)}
 
-Z_primary = np.zeros((len(years), len(top_tags)), dtype=int)
-Z_alt     = np.zeros((len(years), len(top_tags)), dtype=int)
+# one vectorized groupby over the flat records fills both grids
+rec_df = pd.DataFrame.from_records(records, columns=["ticker", "tag", "year", "kind"])
+counts = (rec_df.drop_duplicates()
+          .groupby(["kind", "year", "tag"])["ticker"].nunique())
+
+def grid_for(kind):
+    if kind not in counts.index.get_level_values("kind"):
+        return np.zeros((len(years), len(top_tags)), dtype=int)
+    return (counts.loc[kind].unstack(fill_value=0)
+            .reindex(index=years, columns=top_tags, fill_value=0)
+            .to_numpy())
 
-for (y, tag), comps in primary_counts.items():
-    if tag in tag_to_idx and y in year_to_idx:
-        Z_primary[year_to_idx[y], tag_to_idx[tag]] = len(comps)
-for (y, tag), comps in alternative_counts.items():
-    if tag in tag_to_idx and y in year_to_idx:
-        Z_alt[year_to_idx[y], tag_to_idx[tag]] = len(comps)
+Z_primary = grid_for("primary")
+Z_alt     = grid_for("alternative")
 
 # Overall totals for donut
 total_primary = int(Z_primary.sum())
@@ -163,18 +177,20 @@ fig = make_subplots(
 X = np.arange(len(top_tags))          # numeric indices for tags
 Y = np.array(years)                   # years on Y axis (as numeric)
 
-# We need grid shapes: use np.meshgrid
-XX, YY = np.meshgrid(X, Y)            # shape: (len(years), len(tags))
+# zero-copy (years × tags × 1) view of the tag names — np.broadcast_to only
+# adjusts strides, unlike the old dstack over a nested list comprehension
+tag_arr = np.asarray(top_tags, dtype=object)
+tag_customdata = np.broadcast_to(tag_arr[None, :, None], (len(years), len(top_tags), 1))
 
 # Primary surface
 fig.add_trace(
     go.Surface(
-        x=XX, y=YY, z=Z_primary,
+        x=X, y=Y, z=Z_primary,
         name="Primary",
         showscale=True,
         colorbar=dict(title="# Companies", x=0.45),
         hovertemplate="Tag=%{customdata[0]}<br>Year=%{y}<br>Primary Companies=%{z}<extra></extra>",
-        customdata=np.dstack([[top_tags[i] for i in X] for _ in Y])
+        customdata=tag_customdata
     ),
     row=1, col=1
 )
@@ -182,12 +198,12 @@ fig.add_trace(
 # Alternative surface (slightly more transparent to compare)
 fig.add_trace(
     go.Surface(
-        x=XX, y=YY, z=Z_alt,
+        x=X, y=Y, z=Z_alt,
         name="Alternative",
         opacity=0.8,
         showscale=False,
         hovertemplate="Tag=%{customdata[0]}<br>Year=%{y}<br>Alternative Companies=%{z}<extra></extra>",
-        customdata=np.dstack([[top_tags[i] for i in X] for _ in Y])
+        customdata=tag_customdata
     ),
     row=1, col=1
 )
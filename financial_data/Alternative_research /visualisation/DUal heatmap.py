@@ -1,9 +1,13 @@
 # pip install plotly pandas
 
-import json
+import heapq
+import ijson
+import operator
 from pathlib import Path
-from collections import defaultdict, Counter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -32,32 +36,24 @@ def find_json_files(dirs, recursive=False):
         files.extend(sorted((d.rglob("*.json") if recursive else d.glob("*.json"))))
     return [p for p in files if p.is_file()]
 
-def infer_ticker(json_obj, path: Path):
-    if isinstance(json_obj, dict):
-        t = json_obj.get("ticker") or json_obj.get("symbol") or json_obj.get("companyTicker")
-        if t:
-            return str(t).upper()
-    return path.stem.upper()
-
-def choose_fy_kind(payload):
+def choose_fy_kind(payload, _dict=dict, _int=int):
     """
     Return ('primary'|'alternative', year) if FY is present; else None.
+    Hot path — called once per (file, metric): dict/int are bound as locals
+    and every branch bails out as early as possible.
     """
-    if not isinstance(payload, dict):
+    if type(payload) is not _dict:
         return None
     primary = payload.get("primary")
-    alts    = payload.get("alternatives", [])
-    if isinstance(primary, dict) and primary.get("fp") == "FY" and primary.get("fy") is not None:
-        return "primary", int(primary["fy"])
-    for a in alts:
-        if isinstance(a, dict) and a.get("fp") == "FY" and a.get("fy") is not None:
-            return "alternative", int(a["fy"])
+    if (type(primary) is _dict and primary.get("fp") == "FY"
+            and primary.get("fy") is not None):
+        return "primary", _int(primary["fy"])
+    for a in payload.get("alternatives", ()):
+        if (type(a) is _dict and a.get("fp") == "FY"
+                and a.get("fy") is not None):
+            return "alternative", _int(a["fy"])
     return None
 
-def years_from_pairs(dct):
-    """Extract a set of years from dict keyed by (tag, year)."""
-    return {year for (_tag, year) in dct.keys()}
-
 # ============
 # Aggregate
 # ============
@@ -66,50 +62,52 @@ if not files:
     raise SystemExit("[WARN] No JSON files found in the configured directories.")
 
 all_tickers = set()
-# sets of companies per (tag, year)
-primary_sets     = defaultdict(set)   # (tag, year) -> set(ticker)
-alternative_sets = defaultdict(set)   # (tag, year) -> set(ticker)
+KIND_IDX = {"primary": 0, "alternative": 1}
 
 # also track overall tag popularity to pick top-N tags
 tag_popularity = Counter()
 
-for p in files:
+def parse_file(p):
+    """Read one company JSON and emit its (tag, year, kind) observations.
+
+    Streams the file with ijson: one (period, metrics) pair lives in memory
+    at a time instead of the whole 'financials' dict.
+    """
+    # One dict per file, keyed (year, tag): the first kind seen wins, which
+    # deduplicates and records the observation in a single hash lookup
+    local = {}
+
     try:
-        with p.open("r") as f:
-            data = json.load(f)
+        with open(p, "rb") as f:
+            ticker = next(ijson.items(f, "ticker"), None)
+            ticker = str(ticker).upper() if ticker else p.stem.upper()
+            f.seek(0)
+            for _period, metrics in ijson.kvitems(f, "financials"):
+                if not isinstance(metrics, dict):
+                    continue
+                for tag, payload in metrics.items():
+                    res = choose_fy_kind(payload)
+                    if not res:
+                        continue
+                    kind, year = res
+                    local.setdefault((year, tag), kind)
     except Exception as e:
         print(f"[ERROR] {p}: {e}")
-        continue
-
-    ticker = infer_ticker(data, p)
-    all_tickers.add(ticker)
-
-    financials = data.get("financials")
-    if not isinstance(financials, dict):
-        print(f"[WARN] Missing/invalid 'financials' in {p}")
-        continue
+        return None
+    return ticker, local
 
-    # De-duplicate once per (company, tag, year)
-    seen_year_tag = set()
 
-    for _period, metrics in financials.items():
-        if not isinstance(metrics, dict):
+# independent files parse in parallel; workers return plain tuples, so the
+# merge below needs no locks
+per_file = []
+with ThreadPoolExecutor(max_workers=8) as ex:
+    for parsed in ex.map(parse_file, files):
+        if parsed is None:
             continue
-        for tag, payload in metrics.items():
-            res = choose_fy_kind(payload)
-            if not res:
-                continue
-            kind, year = res
-            key = (year, tag)
-            if key in seen_year_tag:
-                continue
-            seen_year_tag.add(key)
-
-            if kind == "primary":
-                primary_sets[(tag, year)].add(ticker)
-            else:
-                alternative_sets[(tag, year)].add(ticker)
-
+        ticker, local = parsed
+        all_tickers.add(ticker)
+        per_file.append(local)
+        for (_year, tag) in local:
             tag_popularity[tag] += 1  # for top-N filtering
 
 n_companies_found = len(all_tickers)
@@ -117,14 +115,14 @@ if n_companies_found != EXPECTED_NCOS:
     print(f"[WARN] Companies found: {n_companies_found} (expected {EXPECTED_NCOS}). "
           f"Percentages still use 101 as denominator per your spec.")
 
-# ===== FIXED: build 'all_years' correctly using set union =====
-all_years = sorted(years_from_pairs(primary_sets) | years_from_pairs(alternative_sets))
+all_years = sorted({year for local in per_file for (year, _tag) in local})
 if not all_years:
     raise SystemExit("[INFO] No FY entries found across files.")
 
 # Tag selection (top-N tags by overall popularity to keep the figure readable)
 if TOP_N_TAGS is not None:
-    chosen_tags = [t for t, _ in tag_popularity.most_common(TOP_N_TAGS)]
+    chosen_tags = [t for t, _ in heapq.nlargest(TOP_N_TAGS, tag_popularity.items(),
+                                                key=operator.itemgetter(1))]
 else:
     chosen_tags = sorted(tag_popularity.keys())
 
@@ -135,16 +133,20 @@ if not chosen_tags:
 years_idx = {y: i for i, y in enumerate(all_years)}
 tags_idx  = {t: i for i, t in enumerate(chosen_tags)}
 
-P = np.zeros((len(chosen_tags), len(all_years)), dtype=float)  # primary %
-A = np.zeros((len(chosen_tags), len(all_years)), dtype=float)  # alternative %
-
-for (tag, year), comps in primary_sets.items():
-    if tag in tags_idx and year in years_idx:
-        P[tags_idx[tag], years_idx[year]] = 100.0 * len(comps) / float(EXPECTED_NCOS)
-
-for (tag, year), comps in alternative_sets.items():
-    if tag in tags_idx and year in years_idx:
-        A[tags_idx[tag], years_idx[year]] = 100.0 * len(comps) / float(EXPECTED_NCOS)
+# one contiguous int32 block for both kinds: each observation increments a
+# cell directly, no intermediate per-(tag, year) hash structures
+counts = np.zeros((2, len(chosen_tags), len(all_years)), dtype=np.int32)
+for local in per_file:
+    for (year, tag), kind in local.items():
+        ti = tags_idx.get(tag)
+        if ti is not None:
+            counts[KIND_IDX[kind], ti, years_idx[year]] += 1
+
+# single multiply by the precomputed reciprocal instead of a divide per
+# grid; float32 is plenty for display percentages and halves the footprint
+inv = np.float32(100.0 / EXPECTED_NCOS)
+P = counts[0].astype(np.float32) * inv  # primary %
+A = counts[1].astype(np.float32) * inv  # alternative %
 
 # Order tags (rows) by total coverage (primary+alternative) descending
 totals = (P + A).sum(axis=1)
@@ -0,0 +1,101 @@
+# Shared FY-record ingestion for the 2D visualisation scripts.
+#
+# The nested dict walks in here are the scripts' hot path, so everything
+# carries PEP 484 annotations: the module runs fine as plain Python, but it
+# can also be compiled ahead of time (`mypyc aggregator.py`, or a Cython
+# build) for C-level dict traversal without any change on the import side.
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import ijson
+
+# (tag, year, kind) observations per file; rows are (ticker, year, tag, kind)
+FyRecord = tuple[str, int, str]
+FyRow = tuple[str, int, str, str]
+
+
+def find_json_files(dirs: Iterable[Path], recursive: bool = False) -> list[Path]:
+    files: list[Path] = []
+    for d in dirs:
+        if not d.exists():
+            print(f"[WARN] Directory not found: {d}")
+            continue
+        files.extend(sorted(d.rglob("*.json") if recursive else d.glob("*.json")))
+    return [p for p in files if p.is_file()]
+
+
+def choose_fy_kind(payload: Any, _dict: type = dict,
+                   _int: type = int) -> Optional[tuple[str, int]]:
+    """
+    Return ('primary'|'alternative', year) if FY is present (primary preferred,
+    else first FY alternative), else None. Called once per (file, tag): the
+    builtins are bound as default-arg locals, isinstance gives way to exact
+    type checks, and every branch bails out as early as it can.
+    """
+    if type(payload) is not _dict:
+        return None
+    primary = payload.get("primary")
+    if (type(primary) is _dict and primary.get("fp") == "FY"
+            and primary.get("fy") is not None):
+        return "primary", _int(primary["fy"])
+    for a in payload.get("alternatives", ()):
+        if (type(a) is _dict and a.get("fp") == "FY"
+                and a.get("fy") is not None):
+            return "alternative", _int(a["fy"])
+    return None
+
+
+def process_file(p: Path) -> Optional[tuple[str, list[FyRecord]]]:
+    """Parse one company JSON into (ticker, [(tag, year, kind), ...]).
+
+    Runs in a worker process and returns only plain primitives, so pickling
+    the result back stays cheap. ijson streams the file — one
+    (period, metrics) pair is in memory at a time, never the whole document.
+    """
+    # Record each (year, tag) once per company
+    seen_year_tag: set[tuple[int, str]] = set()
+    recs: list[FyRecord] = []
+
+    try:
+        with open(p, "rb") as f:
+            raw_ticker = next(ijson.items(f, "ticker"), None)
+            ticker = sys.intern(str(raw_ticker).upper() if raw_ticker
+                                else p.stem.upper())
+            f.seek(0)
+            for _period, metrics in ijson.kvitems(f, "financials"):
+                if not isinstance(metrics, dict):
+                    continue
+                for tag, payload in metrics.items():
+                    # the same tag text recurs for every period — intern it so
+                    # dedup keys and records share one string object per tag
+                    tag = sys.intern(tag)
+                    res = choose_fy_kind(payload)
+                    if not res:
+                        continue
+                    kind, year = res
+                    key = (year, tag)
+                    if key in seen_year_tag:
+                        continue
+                    seen_year_tag.add(key)
+                    recs.append((tag, year, kind))
+    except Exception as e:
+        print(f"[ERROR] {p}: {e}")
+        return None
+    return ticker, recs
+
+
+def aggregate(files: Iterable[Path], chunksize: int = 8) -> list[FyRow]:
+    """Parse every file across all cores and flatten the results into
+    (ticker, year, tag, kind) rows, ready for a DataFrame."""
+    rows: list[FyRow] = []
+    with ProcessPoolExecutor() as ex:
+        for parsed in ex.map(process_file, files, chunksize=chunksize):
+            if parsed is None:
+                continue
+            ticker, recs = parsed
+            for tag, year, kind in recs:
+                rows.append((ticker, year, tag, kind))
+    return rows
@@ -0,0 +1,38 @@
+# pip install pandas pyarrow
+#
+# One-pass builder for the shared FY-record bundle.
+#
+# Heat map 2d.py, box_visualisation.py and calender timeline.py all plot
+# views of the same (ticker, year, tag, kind) records. Running this script
+# first parses the company JSONs exactly once and persists fy_cache.parquet;
+# each plotting script then finds a fresh cache and skips its own parse, so
+# the JSON work happens one time instead of once per figure.
+
+from pathlib import Path
+
+import pandas as pd
+
+from aggregator import aggregate, find_json_files
+
+# ============
+# Config
+# ============
+DATA_DIRS = [
+    Path("//financial_data/Alternative_research /financial_data_2")
+]
+RECURSIVE  = False
+CACHE_PATH = Path("fy_cache.parquet")   # consumed by the three viz scripts
+
+# ============
+# Build (guarded: aggregator workers re-import __main__ under spawn)
+# ============
+if __name__ == "__main__":
+    files = find_json_files(DATA_DIRS, recursive=RECURSIVE)
+    if not files:
+        raise SystemExit("[WARN] No JSON files found in the configured directories.")
+
+    df_records = pd.DataFrame(aggregate(files),
+                              columns=["ticker", "year", "tag", "kind"])
+    df_records.to_parquet(CACHE_PATH, compression="zstd")
+    print(f"[OK] Wrote {len(df_records)} FY records "
+          f"({df_records['ticker'].nunique()} companies) to {CACHE_PATH}")
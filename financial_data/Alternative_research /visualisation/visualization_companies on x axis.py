@@ -1,6 +1,14 @@
 # pip install plotly pandas
 
 import json
+
+try:  # the scan is parse-bound, so orjson's C decoder pays off directly
+    import orjson
+    def load_json(path):
+        return orjson.loads(path.read_bytes())
+except ImportError:
+    def load_json(path):
+        return json.loads(path.read_text())
 from pathlib import Path
 from collections import defaultdict
 import pandas as pd
@@ -98,8 +106,7 @@ def combine_all(files):
     rows = []
     for p in files:
         try:
-            with p.open("r") as f:
-                data = json.load(f)
+            data = load_json(p)
         except Exception as e:
             print(f"[ERROR] {p}: {e}")
             continue
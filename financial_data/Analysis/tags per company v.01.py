@@ -100,7 +100,7 @@ lookup_resp = requests.get(
 lookup_resp.raise_for_status()
 ticker_table = lookup_resp.json()
 cik_lookup: Dict[str, str] = {
-    entry["ticker"].upper(): str(entry["cik_str"]).zfill(10)
+    entry["ticker"].upper(): f"{entry['cik_str']:010d}"
     for entry in ticker_table.values()
 }
 
@@ -1,6 +1,10 @@
-import os, json, time, requests
+import asyncio
+import os, json, requests
 from collections import defaultdict
 
+import httpx
+import orjson
+
 # ─── CONFIG ────────────────────────────────────────────────────────────────
 HEADERS = {"User-Agent": "eng.sultan.fadi@gmail.com"}      # SEC requirement
 SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
@@ -9,6 +13,10 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 TICKERS = ["AAPL"]
 
+# HTTP/2 multiplexes every tag GET onto one connection; the semaphore keeps
+# us under SEC's ~10 req/s budget instead of an unconditional sleep per call.
+MAX_INFLIGHT = 9
+
 # ─── RELATIONSHIP DICTS ────────────────────────────────────────────────────
 revenues_info = {
     "self": "Revenues",
@@ -45,25 +53,41 @@ METRIC_STRUCT = {
 }
 
 # ─── HELPERS ───────────────────────────────────────────────────────────────
+# Pooled session with adapter-level retries for the sync (non-httpx) calls
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=16, pool_maxsize=16))
+
 def load_cik_mapping(cache="company_tickers.json"):
     if not os.path.exists(cache):
-        txt = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30).text
+        txt = SESSION.get(SEC_TICKER_URL, timeout=30).text
         with open(cache, "w") as f: f.write(txt)
     with open(cache) as f:
         data = json.load(f)
-    return {d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()}
+    return {d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()}
 
-def fetch_metric(cik: str, tag: str):
+async def fetch_metric(client, sem, cik: str, tag: str, retries=3, pause=0.25):
     url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
-    r = requests.get(url, headers=HEADERS, timeout=30)
-    if r.status_code != 200: return []
-    try:
-        units = r.json()["units"]
-    except (ValueError, KeyError):
-        return []
-    vals = []
-    for v in units.values(): vals.extend(v)
-    return vals
+    for attempt in range(retries):
+        try:
+            async with sem:
+                r = await client.get(url)
+            if r.status_code == 200:
+                try:
+                    units = orjson.loads(r.content)["units"]
+                except (ValueError, KeyError):
+                    return []
+                vals = []
+                for v in units.values(): vals.extend(v)
+                return vals
+            if r.status_code in (429, 500, 502, 503, 504):
+                await asyncio.sleep(pause * (attempt + 1))
+                continue
+            return []
+        except httpx.HTTPError:
+            await asyncio.sleep(pause * (attempt + 1))
+    return []
 
 def recent(rows):
     for r in rows:
@@ -71,11 +95,7 @@ def recent(rows):
             yield r
 
 # ─── MAIN ──────────────────────────────────────────────────────────────────
-ticker_to_cik = load_cik_mapping()
-missing = defaultdict(list)
-
-for ticker in TICKERS:
-    cik = ticker_to_cik[ticker]
+async def process_ticker(client, sem, ticker, cik, missing):
     print(f"\n▶ {ticker}  CIK {cik}")
     periods = defaultdict(dict)        # {end_date: {metric_block: {tag: val}}}
 
@@ -84,10 +104,13 @@ for ticker in TICKERS:
         for anc in ("father", "grandfather", "2nd_grandfather"):
             if rel.get(anc): tag_set.add(rel[anc])
 
+        # the whole relationship block goes out in one concurrent batch
+        tags = sorted(tag_set)
+        all_rows = await asyncio.gather(
+            *[fetch_metric(client, sem, cik, t) for t in tags])
+
         found = False
-        for tag in tag_set:
-            rows = fetch_metric(cik, tag)
-            time.sleep(0.25)
+        for tag, rows in zip(tags, all_rows):
             if not rows: continue
             found = True
             for row in recent(rows):
@@ -109,8 +132,19 @@ for ticker in TICKERS:
     with open(path, "w") as f: json.dump(out, f, indent=2)
     print(f"  ↳ saved {path}")
 
-print("\n====== Missing root blocks ======")
-for t in TICKERS:
-    print(f"{t}: {', '.join(missing[t]) if missing[t] else 'none'}")
+async def main():
+    ticker_to_cik = load_cik_mapping()
+    missing = defaultdict(list)
+    sem = asyncio.Semaphore(MAX_INFLIGHT)
+    async with httpx.AsyncClient(http2=True, headers=HEADERS, timeout=30) as client:
+        for ticker in TICKERS:
+            await process_ticker(client, sem, ticker, ticker_to_cik[ticker], missing)
+
+    print("\n====== Missing root blocks ======")
+    for t in TICKERS:
+        print(f"{t}: {', '.join(missing[t]) if missing[t] else 'none'}")
+
+    print("\n✅ Done — metrics grouped under 'Revenue_info' and 'NetIncomeLoss_info'.")
 
-print("\n✅ Done — metrics grouped under 'Revenue_info' and 'NetIncomeLoss_info'.")
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,35 @@
 import requests
 import json
+import orjson
 import os
 import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ─── CONFIG ───────────────────────────────────────────────────────────────
 HEADERS = {
     "User-Agent": "eng.sultan.fadi@gmail.com"  # REQUIRED by SEC
 }
 SEC_TICKER_URL = "https://www.sec.gov/files/company_tickers.json"
+
+# One keep-alive session for all SEC calls — the TLS handshake is paid
+# once, and transient 429/5xx responses retry at the adapter level
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.5,
+                      status_forcelist=[429, 502, 503, 504])))
+
+# SEC filings only change quarterly — cache the companyfacts response on
+# disk so reruns (especially after a partial failure) cost a file read, not
+# a round-trip. Misses (non-200) are cached too, as an empty payload.
+CACHE_DIR = Path("sec_cache")
+CACHE_DIR.mkdir(exist_ok=True)
+CACHE_TTL = 24 * 3600  # seconds
 DATA_DIR = ""
 os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -140,29 +161,48 @@ def load_cik_mapping(path: str = "company_tickers.json") -> dict:
     """Load or download ticker→CIK mapping."""
     if not os.path.exists(path):
         print("Downloading company_tickers.json …")
-        resp = requests.get(SEC_TICKER_URL, headers=HEADERS, timeout=30)
+        resp = SESSION.get(SEC_TICKER_URL, timeout=30)
         resp.raise_for_status()
         with open(path, "w") as fp:
             fp.write(resp.text)
-    with open(path, "r") as fp:
-        data = json.load(fp)
-    return {d["ticker"].upper(): str(d["cik_str"]).zfill(10) for d in data.values()}
+    # orjson parses the ~2 MB tickers file several times faster than stdlib
+    with open(path, "rb") as fp:
+        data = orjson.loads(fp.read())
+    return {d["ticker"].upper(): f"{d['cik_str']:010d}" for d in data.values()}
+
+
+def _flatten_units(payload: dict):
+    all_values = []
+    for unit in payload.get("units", {}).values():
+        all_values.extend(unit)
+    return all_values
 
 
-def fetch_metric(cik: str, tag: str):
-    url = f"https://data.sec.gov/api/xbrl/companyconcept/CIK{cik}/us-gaap/{tag}.json"
-    r = requests.get(url, headers=HEADERS, timeout=30)
+def fetch_facts(cik: str) -> dict:
+    """Fetch every us-gaap tag for one CIK in a single companyfacts call.
+
+    One request replaces the ~20 per-alias companyconcept round-trips —
+    alias probing afterwards is just dict lookups, no I/O.
+    """
+    cache_path = CACHE_DIR / f"facts_{cik}.json"
+    if cache_path.exists() and time.time() - cache_path.stat().st_mtime < CACHE_TTL:
+        try:
+            # orjson: the companyfacts payloads run to several megabytes
+            payload = orjson.loads(cache_path.read_bytes())
+            return payload.get("facts", {}).get("us-gaap", {})
+        except ValueError:
+            pass  # corrupt cache file — fall through and refetch
+
+    url = f"https://data.sec.gov/api/xbrl/companyfacts/CIK{cik}.json"
+    r = SESSION.get(url, timeout=30)
     if r.status_code != 200:
-        return []
+        cache_path.write_text("{}")  # negative cache: repeat 404s stay local
+        return {}
+    cache_path.write_bytes(r.content)
     try:
-        data = r.json().get("units", {})
-        all_values = []
-        for unit in data.values():
-            all_values.extend(unit)
-        return all_values
-        #return r.json()["units"]["USD"]
-    except KeyError:
-        return []
+        return orjson.loads(r.content).get("facts", {}).get("us-gaap", {})
+    except ValueError:
+        return {}
 
 
 def recent_entries(entries):
@@ -173,31 +213,30 @@ def recent_entries(entries):
 
 # ─── MAIN ──────────────────────────────────────────────────────────────────
 
-ticker_to_cik = load_cik_mapping()
-missing_summary = defaultdict(list)
-
-for ticker in TICKERS:
-    cik = ticker_to_cik.get(ticker)
-    if not cik:
-        print(f"CIK not found for {ticker}")
-        continue
+def process_ticker(ticker: str, cik: str):
+    """Fetch every metric for one ticker and derive FreeCashFlow.
 
+    Runs in a worker thread (the GIL is released inside requests), so it
+    returns its results instead of touching any shared state.
+    """
     print(f"\n▶ Processing {ticker} (CIK {cik}) …")
     financials = {}
+    missed = []
+
+    us_gaap = fetch_facts(cik)
 
     for main, aliases in METRIC_ALIASES.items():
         tag_found = False
         for alias in aliases:
-            data = fetch_metric(cik, alias)
+            data = _flatten_units(us_gaap.get(alias, {}))
             if data:
                 tag_found = True
                 for entry in recent_entries(data):
                     period = entry["end"]
                     financials.setdefault(period, {})[main] = entry["val"]
                 break
-            time.sleep(0.25)
         if not tag_found and main != "FreeCashFlow":
-            missing_summary[ticker].append(main)
+            missed.append(main)
 
     # derive FreeCashFlow if possible
     for period, vals in financials.items():
@@ -207,11 +246,28 @@ for ticker in TICKERS:
             vals["FreeCashFlow"] = op - capex
         else:
             # If derivation not possible, mark as missing
-            missing_summary[ticker].append("FreeCashFlow")
+            missed.append("FreeCashFlow")
+
+    return ticker, cik, financials, missed
+
+
+ticker_to_cik = load_cik_mapping()
+missing_summary = defaultdict(list)
 
-    # save JSON
-    with open(os.path.join(DATA_DIR, f"{ticker}.json"), "w") as fp:
-        json.dump({"ticker": ticker, "cik": cik, "financials": financials}, fp, indent=2)
+# Each ticker's fetches are independent I/O — fan them out across threads
+# and keep the JSON writes in the main thread
+with ThreadPoolExecutor(max_workers=8) as ex:
+    futures = [ex.submit(process_ticker, t, ticker_to_cik[t])
+               for t in TICKERS if ticker_to_cik.get(t)]
+    for t in TICKERS:
+        if not ticker_to_cik.get(t):
+            print(f"CIK not found for {t}")
+    for fut in as_completed(futures):
+        ticker, cik, financials, missed = fut.result()
+        missing_summary[ticker].extend(missed)
+        # save JSON
+        with open(os.path.join(DATA_DIR, f"{ticker}.json"), "w") as fp:
+            json.dump({"ticker": ticker, "cik": cik, "financials": financials}, fp, indent=2)
 
 # ─── REPORT MISSING TAGS ───────────────────────────────────────────────────
 print("\n====== Missing Tags Report ======")
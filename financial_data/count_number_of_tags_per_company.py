@@ -26,7 +26,7 @@ ticker_table = requests.get(
 
 # build {ticker: CIK} dict
 cik_lookup = {
-    entry["ticker"].upper(): str(entry["cik_str"]).zfill(10)
+    entry["ticker"].upper(): f"{entry['cik_str']:010d}"
     for entry in ticker_table.values()
 }
 
@@ -1,11 +1,15 @@
 
+import functools
+import heapq
 import json, re, string, time, unicodedata
 from pathlib import Path
 
+import ijson
+
 import lxml.etree as ET
 import requests
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.metrics.pairwise import linear_kernel
 
 # ───────── CONFIG ————————————————————————————————————————————————
 HEADERS      = {"User-Agent": "eng.sultan.fadi@gmail.com (semantic-revenue-finder)"}
@@ -39,11 +43,16 @@ C.Supplies the longer narrative descriptions used for the TF‑IDF similarity sc
    
 '''
 
+# str.translate with a precomputed table beats regex substitution for a fixed
+# character set; frozenset turns the stop-word test into a single hash lookup.
+_TRANS = str.maketrans(string.punctuation, " " * len(string.punctuation))
+_STOP  = frozenset(ENGLISH_STOP_WORDS)
+
+@functools.lru_cache(maxsize=65536)
 def _normalize(txt: str) -> str:
-    txt = unicodedata.normalize("NFKD", txt).lower()
-    txt = re.sub(f"[{re.escape(string.punctuation)}]", " ", txt)
+    txt = unicodedata.normalize("NFKD", txt).lower().translate(_TRANS)
     return " ".join(DOMAIN_SYNS.get(w, w)
-                    for w in txt.split() if w not in ENGLISH_STOP_WORDS)
+                    for w in txt.split() if w not in _STOP)
 '''"The company’s net sales—after returns—totaled €10 million."--->
 company net revenue returns totaled 10 million
 That tidy, synonym‑normalised string is what the TF‑IDF vectoriser sees—making
@@ -54,12 +63,15 @@ That tidy, synonym‑normalised string is what the TF‑IDF vectoriser sees—ma
 # ───────── FETCH APPLE’s REPORTED TAGS —————————————————————————
 def apple_tags() -> set[str]:
     fp = CACHE_DIR / "aapl_facts.json"; _dl(FACTS_URL, fp)
-    facts = json.loads(fp.read_bytes()); tags = set()
-    for tag, node in facts["facts"]["us-gaap"].items():
-        if tag == "Revenues": continue                     # we know it’s absent
-        for rows in node["units"].values():
-            if any(int(r.get("fy", 0)) >= YEAR_CUTOFF for r in rows):
-                tags.add(tag); break
+    tags = set()
+    # Stream the 20+ MB companyfacts file tag-by-tag instead of materializing
+    # the whole dict — peak memory stays at one concept node at a time.
+    with fp.open("rb") as fh:
+        for tag, node in ijson.kvitems(fh, "facts.us-gaap"):
+            if tag == "Revenues": continue                 # we know it’s absent
+            for rows in node["units"].values():
+                if any(int(r.get("fy", 0)) >= YEAR_CUTOFF for r in rows):
+                    tags.add(tag); break
     return tags
 '''apple_tags() extracts every US‑GAAP tag Apple has used in 2014 present 
 (except the unused generic Revenues tag) 
@@ -68,6 +80,13 @@ he resulting tag set becomes the candidate pool for finding the best
  “revenue” substitute later in the script.'''
 
 # ───────── LOAD TAXONOMY LABEL+DEFINITION TEXTS ——————————————
+
+# clark-notation names resolved once instead of rebuilt inside the parse loops
+_LABEL_TAG   = "{http://www.xbrl.org/2003/linkbase}label"
+_XLINK_ROLE  = "{http://www.w3.org/1999/xlink}role"
+_XLINK_LABEL = "{http://www.w3.org/1999/xlink}label"
+
+
 def taxo_texts() -> dict[str, str]:
     for yr in TRY_YEARS:
         base = f"https://xbrl.fasb.org/us-gaap/{yr}/elts"#https://xbrl.fasb.org/us-gaap/2024/elts/
@@ -89,16 +108,24 @@ def taxo_texts() -> dict[str, str]:
             '''grabs every GAAP concept’s standard label: extracts the tag name from the xlink:label ID, 
             then saves its human‑readable English text in the texts dictionary for TF‑IDF scoring and comparisons.'''
 
-            for lb in ET.parse(lab_fp).iterfind(".//link:label", ns):
-                if lb.get("{http://www.w3.org/1999/xlink}role").endswith("/label"):
-                    tag = lb.get("{http://www.w3.org/1999/xlink}label").split("_", 1)[-1]
+            # iterparse streams one <link:label> at a time and clears it after
+            # use, so the tens-of-MB linkbase never becomes a full DOM in RAM.
+            for _, lb in ET.iterparse(str(lab_fp), tag=_LABEL_TAG):
+                if lb.get(_XLINK_ROLE, "").endswith("/label"):
+                    tag = lb.get(_XLINK_LABEL, "").split("_", 1)[-1]
                     texts.setdefault(tag, []).append(lb.text or "")
+                lb.clear()
+                while lb.getprevious() is not None:
+                    del lb.getparent()[0]
             #print("tags:",texts)
             # Documentation labels (definitions)
-            for lb in ET.parse(doc_fp).iterfind(".//link:label", ns):
-                if lb.get("{http://www.w3.org/1999/xlink}role").endswith("/documentation"):
-                    tag = lb.get("{http://www.w3.org/1999/xlink}label").split("_", 1)[-1]
+            for _, lb in ET.iterparse(str(doc_fp), tag=_LABEL_TAG):
+                if lb.get(_XLINK_ROLE, "").endswith("/documentation"):
+                    tag = lb.get(_XLINK_LABEL, "").split("_", 1)[-1]
                     texts.setdefault(tag, []).append(lb.text or "")
+                lb.clear()
+                while lb.getprevious() is not None:
+                    del lb.getparent()[0]
             #print("docum", len(texts),texts)
             return {k: " ".join(v) for k, v in texts.items()}
 
@@ -135,14 +162,17 @@ def choose_revenue_substitute(top_n: int = 5):
      The resulting matrix vec has shape (documents×unique terms) and is ready for cosine‑similarity comparisons.'''
 
     print("vectorized corpus",vec.shape,vec)
-    sims = cosine_similarity(vec[0:1], vec[1:]).ravel()
+    # TF-IDF rows are already L2-normalized, so linear_kernel (plain dot
+    # product) equals cosine_similarity while skipping its re-normalize pass.
+    sims = linear_kernel(vec[0:1], vec[1:]).ravel()
     '''`vec[0:1]` is the TF‑IDF vector for your **target revenue text**; `
         vec[1:]` is the matrix of vectors for every Apple tag.
-`       cosine_similarity` computes the cosine of the angle between the target vector and each other vector, giving a similarity score\[0,1].
+`       linear_kernel` on unit-norm rows computes the cosine of the angle between the target vector and each other vector, giving a similarity score\[0,1].
         .ravel()` flattens the 1×*n* result into a 1‑D array `sims`, where each element is “how revenue‑like this Apple tag is.
         '''
 
-    ranking = sorted(zip(tag_list, sims), key=lambda x: x[1], reverse=True)[:top_n]
+    # O(N log n) partial selection — no need to fully sort all candidates
+    ranking = heapq.nlargest(top_n, zip(tag_list, sims), key=lambda x: x[1])
 
     print("\nTop semantic matches to missing revenue concept (Apple)")
     print("────────────────────────────────────────────────────────────")
@@ -52,7 +52,7 @@ def get_cik(ticker):
     companies = r.json()
     for company in companies.values():
         if company["ticker"].upper() == ticker.upper():
-            return str(company["cik_str"]).zfill(10)
+            return f"{company['cik_str']:010d}"
     return None
 
 # Fetch metric data for a given CIK and tag